@@ -1,356 +1,550 @@
 # extract_info.py
 import json
+import logging
+import orjson
 import re
 import os
 import time
-from typing import List, Dict, Any, Tuple
+import asyncio
+import hashlib
+import tempfile
+import bisect
+import unicodedata
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional
 import pandas as pd
-from tqdm import tqdm
+from tqdm.auto import tqdm
+import tiktoken
 import requests
 import time
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Set the root directory for relative paths
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Models for the summary and extraction steps. Extraction is constrained by the output schema,
+# so a small or fine-tuned model (e.g. "ft:gpt-4.1-nano-...") can be used for it alone.
+SUMMARY_MODEL = os.environ.get("OPENAI_SUMMARY_MODEL", "gpt-4.1-nano")
+EXTRACTION_MODEL = os.environ.get("OPENAI_EXTRACTION_MODEL", "gpt-4.1-nano")
+
+# Maximum number of in-flight LLM requests, shared by all articles of a file (size this to the account's rate limit)
+MAX_CONCURRENT_REQUESTS = 8
+
+# HTTP timeouts in seconds for LLM requests (read timeout covers long streamed responses)
+HTTP_TIMEOUT = 60.0
+HTTP_CONNECT_TIMEOUT = 5.0
+
+# Retries on rate limit / transient API errors (the SDK backs off exponentially and honors retry-after)
+MAX_RETRIES = 5
+
+# Article chunk size in tokens, counted with the tokenizer of the gpt-4o / gpt-4.1 model families
+CHUNK_SIZE_TOKENS = 1500
+TOKENIZER_ENCODING = "o200k_base"
+
+# Chunk extraction request settings (shared by live requests and Batch API jobs)
+# (compact extraction output for a 1500-token chunk is typically well under 2000 tokens)
+CHUNK_TEMPERATURE = 0.2
+CHUNK_MAX_TOKENS = 2000
+
+# Stop sequence for extraction requests, to cut off runaway whitespace after the JSON
+EXTRACTION_STOP = ["\n\n\n"]
+
+# Structured output schema for entity/relation extraction, so the model returns strict JSON
+# (optional fields are nullable because strict mode requires every property).
+# Short keys keep the output small; they are expanded with the mappings below after parsing.
+EXTRACTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "extraction",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "entities": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "i": {"type": "string"},
+                            "t": {
+                                "type": "string",
+                                "enum": ["PERSON", "ORGANIZATION", "LOCATION", "EVENT", "CONCEPT", "TIME", "ARTIFACT", "SENTIMENT"]
+                            },
+                            "x": {"type": "string"},
+                            "n": {"type": ["string", "null"]},
+                            "c": {"type": "number"}
+                        },
+                        "required": ["i", "t", "x", "n", "c"],
+                        "additionalProperties": False
+                    }
+                },
+                "relations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "s": {"type": "string"},
+                            "p": {"type": "string"},
+                            "o": {"type": "string"},
+                            "ct": {"type": ["string", "null"]},
+                            "cl": {"type": ["string", "null"]},
+                            "c": {"type": "number"}
+                        },
+                        "required": ["s", "p", "o", "ct", "cl", "c"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["entities", "relations"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Structured output schema for Method 2: the article summary followed by its entities/relations
+SUMMARY_EXTRACTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "summary_extraction",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                **EXTRACTION_RESPONSE_FORMAT["json_schema"]["schema"]["properties"]
+            },
+            "required": ["summary", "entities", "relations"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Compact output keys -> full keys used in the results
+ENTITY_KEYS = {"i": "id", "t": "type", "x": "text", "n": "normalized", "c": "confidence"}
+RELATION_KEYS = {"s": "subject", "p": "predicate", "o": "object", "ct": "context_time", "cl": "context_location", "c": "confidence"}
+
+# Seconds between status checks while a Batch API job is running
+BATCH_POLL_INTERVAL = 60
+
+# On-disk cache of LLM responses, so re-runs skip requests that were already answered
+LLM_CACHE_DIR = os.path.join(ROOT_DIR, ".cache", "llm")
+
+# Words and sentence-ending characters used when splitting articles into chunks
+WORD_RE = re.compile(r'\S+')
+SENTENCE_END_CHARS = ".!?"
+
+# Entity text normalization for deduplication (NFKC keeps dash variants distinct, so map them to "-")
+WHITESPACE_RE = re.compile(r'\s+')
+DASH_TRANSLATION = str.maketrans({dash: "-" for dash in "\u2010\u2011\u2012\u2013\u2014\u2015\u2212"})
+
 # Set OpenAI API key (set as environment variable or input directly)
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=MAX_RETRIES)
+
+def create_async_client() -> AsyncOpenAI:
+    """
+    Create the async OpenAI client shared by all requests of one run.
+    Its connection pool is sized to MAX_CONCURRENT_REQUESTS and keeps connections alive,
+    so concurrent requests reuse TLS connections instead of waiting for or opening new ones.
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS * 2, max_keepalive_connections=MAX_CONCURRENT_REQUESTS),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+    return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=MAX_RETRIES, http_client=http_client)
+
+# LLM response cache functions
+def llm_cache_key(model: str, messages: List[Dict], temperature: float, response_format: Optional[Dict] = None) -> str:
+    """
+    Build a cache key from everything that determines the LLM response.
+    """
+    payload = json.dumps({"m": model, "p": messages, "t": temperature, "f": response_format}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def summary_cache_key(model: str, article_text: str, article_title: str, article_date: str) -> str:
+    """
+    Build the cache key for an article's summary and extraction from the model and the article itself.
+    """
+    payload = f"{model}|{article_date}|{article_title}|{article_text}"
+    return "summary_extraction_" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_cached_response(key: str) -> Optional[str]:
+    """
+    Return the cached response text for a key, or None on a cache miss.
+    """
+    cache_path = os.path.join(LLM_CACHE_DIR, f"{key}.txt")
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+def save_cached_response(key: str, response_text: str) -> None:
+    """
+    Store a response text in the cache (written atomically so an interrupted run leaves no partial entry).
+    """
+    os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=LLM_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        f.write(response_text)
+    os.replace(tmp_path, os.path.join(LLM_CACHE_DIR, f"{key}.txt"))
 
 # Preprocessing function: Split text into chunks
-def split_into_chunks(text: str, max_words: int = 500) -> List[str]:
+@lru_cache(maxsize=None)
+def get_tokenizer() -> tiktoken.Encoding:
+    """
+    Load the tokenizer once, on first use.
     """
-    Split text into chunks with maximum max_words.
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+def split_into_chunks(text: str, max_tokens: int = CHUNK_SIZE_TOKENS) -> List[str]:
+    """
+    Split text into chunks with maximum max_tokens (model tokens, not words).
     Find sentence endings to ensure chunks end at complete sentences.
+    The text is tokenized once, and sentence ends are located once up front.
+    Chunks are slices of the original text, so whitespace inside a chunk is kept as is.
     """
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_word_count = 0
+    word_spans = [m.span() for m in WORD_RE.finditer(text)]
+    num_words = len(word_spans)
+    # Indices of words that end a sentence, found in one pass
+    sentence_end_words = [i for i, (_, end) in enumerate(word_spans) if text[end - 1] in SENTENCE_END_CHARS]
+    
+    # Number of tokens before each word (tokens carry their leading space, so they start before the word)
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(text)
+    _, token_starts = tokenizer.decode_with_offsets(tokens)
+    tokens_before_word = [bisect.bisect_left(token_starts, start) for start, _ in word_spans]
+    num_tokens = len(tokens)
     
-    for word in words:
-        current_chunk.append(word)
-        current_word_count += 1
+    chunks = []
+    chunk_start = 0
+    
+    while chunk_start < num_words and num_tokens - tokens_before_word[chunk_start] > max_tokens:
+        # Words chunk_start .. limit - 1 fit within max_tokens (at least one word per chunk)
+        limit = bisect.bisect_right(tokens_before_word, tokens_before_word[chunk_start] + max_tokens, lo=chunk_start) - 1
+        limit = max(limit, chunk_start + 1)
+        # Find the last sentence ending in the current chunk
+        k = bisect.bisect_right(sentence_end_words, limit - 1) - 1
         
-        if current_word_count >= max_words:
-            # Find the last sentence ending in the current chunk
-            chunk_text = ' '.join(current_chunk)
-            last_sentence_end = max(chunk_text.rfind('. '), chunk_text.rfind('! '), chunk_text.rfind('? '))
-            
-            if last_sentence_end != -1:
-                # Cut at the sentence end
-                first_part = chunk_text[:last_sentence_end+1]
-                second_part = chunk_text[last_sentence_end+2:]
-                
-                chunks.append(first_part)
-                current_chunk = second_part.split()
-                current_word_count = len(current_chunk)
-            else:
-                # If no period found, use the current chunk as is
-                chunks.append(chunk_text)
-                current_chunk = []
-                current_word_count = 0
+        if k >= 0 and sentence_end_words[k] >= chunk_start:
+            # Cut at the sentence end
+            cut = sentence_end_words[k] + 1
+        else:
+            # If no period found, use the current chunk as is
+            cut = limit
+        
+        chunks.append(text[word_spans[chunk_start][0]:word_spans[cut - 1][1]])
+        chunk_start = cut
     
     # Process remaining words
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+    if chunk_start < num_words:
+        chunks.append(text[word_spans[chunk_start][0]:word_spans[-1][1]])
     
     return chunks
 
-# Article summarization function
-def summarize_article(article_text: str, article_title: str, article_date: str, model: str = "gpt-4.1-nano") -> str:
-    """
-    Use LLM to summarize an article.
-    """    
-    prompt = f"""    
-    You are an expert in summarizing historical documents.
-    The following is a newspaper article published on {article_date}. Please summarize this article concisely in English while preserving important entities such as people, places, time and events mentioned in the article, as well as their relationships.
-    Maintain temporal and spatial information as much as possible.
+# Chunk extraction prompt
+# Instructions shared by every extraction request. They go first, in the system message,
+# so the identical prefix can be served from OpenAI's prompt cache across requests.
+EXTRACTION_SYSTEM_PROMPT = """
+You are an expert in extracting entities and relations from historical documents.
+You will be given a newspaper article, or a portion or summary of one, with its title and publication date.
 
-    Title: {article_title}
-    
-    Content:
-    {article_text}
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=1000
-        )
-        summary = response.choices[0].message.content
-        return summary
-    except Exception as e:
-        print(f"Error during summarization: {e}")
-        return ""
+First, carefully read and understand the content. Then extract all significant entities and their relationships.
+Think step-by-step about how entities relate to each other, ensuring relationships accurately capture the meaning of the text and are logically sound.
 
-# Entity and relation extraction function (chunk-based)
-def extract_entities_relations_from_chunk(chunk: str, article_title: str, article_date: str, model: str = "gpt-4.1-nano") -> Dict:
+Entity types to extract include:
+- PERSON (individuals, historical figures, groups of people)
+- ORGANIZATION (governments, companies, institutions, political parties)
+- LOCATION (cities, countries, regions, landmarks, geographical features)
+- EVENT (wars, meetings, ceremonies, incidents, disasters)
+- CONCEPT (ideas, movements, policies, theories, social phenomena)
+- TIME (dates, periods, durations, eras, deadlines)
+- ARTIFACT (objects, products, technologies, buildings, monuments)
+- SENTIMENT (public opinion, social mood, emotional responses)
+
+Respond with JSON in the following compact format:
+{
+  "entities": [
+    {"i": "E1", "t": "PERSON", "x": "person name", "n": null, "c": 0.9},
+    {"i": "E2", "t": "EVENT", "x": "event name", "n": null, "c": 0.85},
+    {"i": "E3", "t": "LOCATION", "x": "place name", "n": "standardized place name", "c": 0.95},
+    {"i": "E4", "t": "TIME", "x": "date or time expression", "n": "YYYY-MM-DD or period", "c": 0.8}
+  ],
+  "relations": [
+    {"s": "E1", "p": "relation type", "o": "E2", "ct": "E4", "cl": "E3", "c": 0.75}
+  ]
+}
+
+Entity keys: i = id, t = type, x = text, n = normalized form (or null), c = confidence
+Relation keys: s = subject id, p = predicate, o = object id, ct = context time id (or null), cl = context location id (or null), c = confidence
+
+Guidelines for extraction:
+1. Include normalized forms ("n") for both TIME and LOCATION entities with standardized forms
+2. For TIME entities, try to normalize dates to "YYYY-MM-DD" format, or "YYYY-MM" or "YYYY" if more precise information isn't available
+3. For LOCATION entities, use the most specific standardized name
+4. Only extract relationships that are explicitly or strongly implied in the text
+5. In relations, use "ct" and "cl" to indicate when and where the relationship took place (if mentioned)
+6. Express confidence as a value between 0.0-1.0 to represent the certainty of the information
+7. Ensure all relationships are logically coherent and match the meaning in the original text
+"""
+
+def build_chunk_extraction_messages(chunk: str, article_title: str, article_date: str) -> List[Dict]:
     """
-    Use LLM to extract entities and relations from a text chunk.
+    Build the chat messages for extracting entities and relations from a text chunk.
+    Shared by the live requests and the Batch API job so both send identical prompts.
     """
     prompt = f"""
-    You are an expert in extracting entities and relations from historical documents.
     The following is a portion of a newspaper article published on {article_date}.
     
-    First, carefully read and understand the content. Then extract all significant entities and their relationships.
-    Think step-by-step about how entities relate to each other, ensuring relationships accurately capture the meaning of the text and are logically sound.
-    
-    Entity types to extract include:
-    - PERSON (individuals, historical figures, groups of people)
-    - ORGANIZATION (governments, companies, institutions, political parties)
-    - LOCATION (cities, countries, regions, landmarks, geographical features)
-    - EVENT (wars, meetings, ceremonies, incidents, disasters)
-    - CONCEPT (ideas, movements, policies, theories, social phenomena)
-    - TIME (dates, periods, durations, eras, deadlines)
-    - ARTIFACT (objects, products, technologies, buildings, monuments)
-    - SENTIMENT (public opinion, social mood, emotional responses)
-    
     Title: {article_title}
     
     Content:
     {chunk}
-    
-    Please respond in the following JSON format:
-    ```json
-    {{
-      "entities": [
-        {{"id": "E1", "type": "PERSON", "text": "person name", "confidence": 0.9}},
-        {{"id": "E2", "type": "EVENT", "text": "event name", "confidence": 0.85}},
-        {{"id": "E3", "type": "LOCATION", "text": "place name", "normalized": "standardized place name", "confidence": 0.95}},
-        {{"id": "E4", "type": "TIME", "text": "date or time expression", "normalized": "YYYY-MM-DD or period", "confidence": 0.8}}
-      ],
-      "relations": [
-        {{"subject": "E1", "predicate": "relation type", "object": "E2", "context_time": "E4", "context_location": "E3", "confidence": 0.75}}
-      ]
-    }}
-    ```
-    
-    Guidelines for extraction:
-    1. Include "normalized" fields for both TIME and LOCATION entities with standardized forms
-    2. For TIME entities, try to normalize dates to "YYYY-MM-DD" format, or "YYYY-MM" or "YYYY" if more precise information isn't available
-    3. For LOCATION entities, use the most specific standardized name
-    4. Only extract relationships that are explicitly or strongly implied in the text
-    5. In relations, use "context_time" and "context_location" to indicate when and where the relationship took place (if mentioned)
-    6. Express confidence as a value between 0.0-1.0 to represent the certainty of the information
-    7. Ensure all relationships are logically coherent and match the meaning in the original text
     """
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+# Parse a structured extraction response
+def parse_extraction_response(result_text: Optional[str]) -> Dict:
+    """
+    Parse the entities/relations JSON returned with EXTRACTION_RESPONSE_FORMAT.
+    Compact keys are expanded to the full names, and null optional fields are dropped
+    so results have the same shape as before.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Result text: %s", result_text)
+
+    # The content is empty if the model refused the request
+    if result_text is None:
+        return {"error": "Empty response"}
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=2000
-        )
-        result_text = response.choices[0].message.content
-        
-        print(f"Result text: {result_text}") ## debugging
+        result = orjson.loads(result_text)
+    except orjson.JSONDecodeError:
+        # Truncated output (e.g. max_tokens reached)
+        return {"error": "JSON parsing error", "raw_response": result_text}
+    
+    for key, key_names in (("entities", ENTITY_KEYS), ("relations", RELATION_KEYS)):
+        # Skip malformed rows that don't have exactly the expected keys
+        result[key] = [
+            {key_names[k]: v for k, v in item.items() if v is not None}
+            for item in result.get(key, [])
+            if item.keys() == key_names.keys()
+        ]
+    
+    return result
 
-        # Extract just the JSON part
-        json_match = re.search(r'```json\s*(.*?)\s*```', result_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # If no JSON tags, try to find JSON format in the entire text
-            json_match = re.search(r'(\{\s*"entities".*\})', result_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                return {"error": "Could not find JSON format", "raw_response": result_text}
+# Streamed chat completion
+async def stream_chat_completion(aclient: AsyncOpenAI, **kwargs) -> Optional[str]:
+    """
+    Run a chat completion with stream=True and assemble the content from the deltas,
+    so tokens are received as they are generated while other requests are in flight.
+    Returns None if no content was produced (e.g. the model refused the request).
+    """
+    parts = []
+    finish_reason = None
+    stream = await aclient.chat.completions.create(stream=True, **kwargs)
+    async for chunk in stream:
+        # Some stream events (e.g. usage) carry no choices
+        if not chunk.choices:
+            continue
+        if chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+        if chunk.choices[0].finish_reason:
+            finish_reason = chunk.choices[0].finish_reason
+    
+    if finish_reason == "length":
+        print(f"Warning: response truncated at max_tokens={kwargs.get('max_tokens')}")
+    
+    return "".join(parts) if parts else None
+
+# Entity and relation extraction function (chunk-based)
+async def extract_entities_relations_from_chunk(chunk: str, article_title: str, article_date: str, aclient: AsyncOpenAI, model: str = EXTRACTION_MODEL) -> Dict:
+    """
+    Use LLM to extract entities and relations from a text chunk.
+    The request is issued through the given async client so that chunks can be processed concurrently.
+    """
+    messages = build_chunk_extraction_messages(chunk, article_title, article_date)
+    
+    # Skip the API call if the same request was already answered
+    cache_key = llm_cache_key(model, messages, CHUNK_TEMPERATURE, EXTRACTION_RESPONSE_FORMAT)
+    result_text = load_cached_response(cache_key)
+    
+    try:
+        if result_text is None:
+            result_text = await stream_chat_completion(
+                aclient,
+                model=model,
+                messages=messages,
+                temperature=CHUNK_TEMPERATURE,
+                max_tokens=CHUNK_MAX_TOKENS,
+                stop=EXTRACTION_STOP,
+                response_format=EXTRACTION_RESPONSE_FORMAT
+            )
         
-        try:
-            result = json.loads(json_str)
-            return result
-        except json.JSONDecodeError:
-            return {"error": "JSON parsing error", "raw_response": result_text}
+        result = parse_extraction_response(result_text)
+        # Only cache responses that parsed, so failed ones are retried on the next run
+        if "error" not in result:
+            save_cached_response(cache_key, result_text)
+        return result
     
     except Exception as e:
         print(f"Error during entity and relation extraction: {e}")
         return {"error": str(e)}
 
-# Entity and relation extraction function from summary
-def extract_entities_relations_from_summary(summary: str, article_title: str, article_date: str, model: str = "gpt-4.1-nano") -> Dict:
+# Summarization and extraction prompt (Method 2): the summary and its entities/relations come from one request
+SUMMARY_EXTRACTION_SYSTEM_PROMPT = """
+You are an expert in summarizing historical documents and in extracting entities and relations from them.
+
+First, summarize the given newspaper article concisely in English while preserving important entities such as people, places, time and events mentioned in the article, as well as their relationships.
+Maintain temporal and spatial information as much as possible. Put the summary in the "summary" field of the JSON response.
+
+Then extract entities and relations from your summary as described below, and put them in the "entities" and "relations" fields.
+""" + EXTRACTION_SYSTEM_PROMPT
+
+# Summarization + entity and relation extraction function (summary-based)
+async def summarize_and_extract(article_text: str, article_title: str, article_date: str, aclient: AsyncOpenAI, model: str = SUMMARY_MODEL) -> Tuple[Dict, str]:
     """
-    Use LLM to extract entities and relations from a summarized text.
+    Use LLM to summarize an article and extract entities and relations from the summary in a single request.
+    Responses are cached by model and article content, so they are reused across runs
+    until the article or the model changes (delete the cache to apply prompt changes).
+    Returns the extraction result and the summary.
     """
     prompt = f"""
-    You are an expert in extracting entities and relations from historical documents.
-    The following is a summary of a newspaper article published on {article_date}.
-    
-    First, carefully read and understand the content. Then extract all significant entities and their relationships.
-    Think step-by-step about how entities relate to each other, ensuring relationships accurately capture the meaning of the text and are logically sound.
-    
-    Entity types to extract include:
-    - PERSON (individuals, historical figures, groups of people)
-    - ORGANIZATION (governments, companies, institutions, political parties)
-    - LOCATION (cities, countries, regions, landmarks, geographical features)
-    - EVENT (wars, meetings, ceremonies, incidents, disasters)
-    - CONCEPT (ideas, movements, policies, theories, social phenomena)
-    - TIME (dates, periods, durations, eras, deadlines)
-    - ARTIFACT (objects, products, technologies, buildings, monuments)
-    - SENTIMENT (public opinion, social mood, emotional responses)
+    The following is a newspaper article published on {article_date}.
     
     Title: {article_title}
     
     Content:
-    {summary}
-    
-    Please respond in the following JSON format:
-    ```json
-    {{
-      "entities": [
-        {{"id": "E1", "type": "PERSON", "text": "person name", "confidence": 0.9}},
-        {{"id": "E2", "type": "EVENT", "text": "event name", "confidence": 0.85}},
-        {{"id": "E3", "type": "LOCATION", "text": "place name", "normalized": "standardized place name", "confidence": 0.95}},
-        {{"id": "E4", "type": "TIME", "text": "date or time expression", "normalized": "YYYY-MM-DD or period", "confidence": 0.8}}
-      ],
-      "relations": [
-        {{"subject": "E1", "predicate": "relation type", "object": "E2", "context_time": "E4", "context_location": "E3", "confidence": 0.75}}
-      ]
-    }}
-    ```
-    
-    Guidelines for extraction:
-    1. Include "normalized" fields for both TIME and LOCATION entities with standardized forms
-    2. For TIME entities, try to normalize dates to "YYYY-MM-DD" format, or "YYYY-MM" or "YYYY" if more precise information isn't available
-    3. For LOCATION entities, use the most specific standardized name
-    4. Only extract relationships that are explicitly or strongly implied in the text
-    5. In relations, use "context_time" and "context_location" to indicate when and where the relationship took place (if mentioned)
-    6. Express confidence as a value between 0.0-1.0 to represent the certainty of the information
-    7. Ensure all relationships are logically coherent and match the meaning in the original text
+    {article_text}
     """
+    messages = [
+        {"role": "system", "content": SUMMARY_EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    temperature = 0.2
+    
+    # Skip the API call if the same article was already processed
+    cache_key = summary_cache_key(model, article_text, article_title, article_date)
+    result_text = load_cached_response(cache_key)
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=3000
-        )
-        result_text = response.choices[0].message.content
-
-        print(f"Result text: {result_text}") ## debugging
+        if result_text is None:
+            response = await aclient.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=4000,
+                stop=EXTRACTION_STOP,
+                response_format=SUMMARY_EXTRACTION_RESPONSE_FORMAT
+            )
+            result_text = response.choices[0].message.content
+            if response.choices[0].finish_reason == "length":
+                print("Warning: response truncated at max_tokens=4000")
         
-        # Extract just the JSON part
-        json_match = re.search(r'```json\s*(.*?)\s*```', result_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # If no JSON tags, try to find JSON format in the entire text
-            json_match = re.search(r'(\{\s*"entities".*\})', result_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                return {"error": "Could not find JSON format", "raw_response": result_text}
-        
-        try:
-            result = json.loads(json_str)
-            return result
-        except json.JSONDecodeError:
-            return {"error": "JSON parsing error", "raw_response": result_text}
+        result = parse_extraction_response(result_text)
+        # Only cache responses that parsed, so failed ones are retried on the next run
+        if "error" not in result:
+            save_cached_response(cache_key, result_text)
+        summary = result.pop("summary", "")
+        return result, summary
     
     except Exception as e:
-        print(f"Error during entity and relation extraction: {e}")
-        return {"error": str(e)}
+        print(f"Error during summarization and extraction: {e}")
+        return {"error": str(e)}, ""
 
 # Function for deduplication and entity normalization
+def normalize_entity_text(text: str) -> str:
+    """
+    Normalize an entity text for matching: Unicode NFKC, case folding, unified dashes and whitespace.
+    e.g. "Austria–Hungary" and "austria-hungary" give the same key.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(DASH_TRANSLATION)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
 def merge_and_normalize_results(results: List[Dict]) -> Dict:
     """
     Merge and normalize entities and relations extracted from multiple chunks.
     Uses a unified entity ID system where all entities (including time and location)
     are treated as entities with different types.
+    Each result (chunk) is processed in a single pass, mapping its relations with the
+    IDs of its own entities, since every chunk numbers its entities from E1.
     """
     all_entities = []
     all_relations = []
     
     # Mapping table for entity normalization
-    entity_mapping = {}  # original ID -> new ID
     entity_type_text_to_id = {}  # (entity_type, normalized_text) -> new ID
+    relation_signatures = set()  # To eliminate duplicate relations
     
-    # Collect and normalize all entities (including location and time entities)
     entity_counter = 1
     
     for result in results:
         if "error" in result:
             continue
+        
+        entity_mapping = {}  # original ID in this result -> new ID
+        
+        # Collect and normalize entities (including location and time entities)
+        for entity in result.get("entities", []):
+            normalized_text = normalize_entity_text(entity["text"])
             
-        if "entities" in result:
-            for entity in result.get("entities", []):
-                entity_type = entity["type"]
-                normalized_text = entity["text"].strip().lower()
-                
-                # Create a composite key of type and text to differentiate
-                # e.g., "Vienna" as a location vs "Vienna" as an organization
-                type_text_key = (entity_type, normalized_text)
-                
-                if type_text_key in entity_type_text_to_id:
-                    # If entity already exists, just update the ID mapping
-                    entity_mapping[entity["id"]] = entity_type_text_to_id[type_text_key]
-                else:
-                    # If it's a new entity, add it and create ID mapping
-                    new_id = f"E{entity_counter}"
-                    entity_counter += 1
-                    entity_type_text_to_id[type_text_key] = new_id
-                    entity_mapping[entity["id"]] = new_id
-                    
-                    # Create a new entity with all properties from the original
-                    new_entity = entity.copy()
-                    new_entity["id"] = new_id
-                    all_entities.append(new_entity)
-    
-    # Collect and normalize relations
-    relation_signatures = set()  # To eliminate duplicate relations
-    
-    for result in results:
-        if "relations" in result:
-            for relation in result.get("relations", []):
-                # Apply ID mapping for subject and object
-                if relation["subject"] in entity_mapping:
-                    new_subject = entity_mapping[relation["subject"]]
-                else:
-                    continue  # Skip if entity not mapped
-                    
-                if relation["object"] in entity_mapping:
-                    new_object = entity_mapping[relation["object"]]
-                else:
-                    continue  # Skip if entity not mapped
+            # Create a composite key of type and text to differentiate
+            # e.g., "Vienna" as a location vs "Vienna" as an organization
+            type_text_key = (entity["type"], normalized_text)
+            
+            new_id = entity_type_text_to_id.get(type_text_key)
+            if new_id is None:
+                # If it's a new entity, add it
+                new_id = f"E{entity_counter}"
+                entity_counter += 1
+                entity_type_text_to_id[type_text_key] = new_id
                 
-                # Map context time ID
-                new_context_time = None
-                if "context_time" in relation and relation["context_time"] in entity_mapping:
-                    new_context_time = entity_mapping[relation["context_time"]]
-                    
-                # Map context location ID
-                new_context_location = None
-                if "context_location" in relation and relation["context_location"] in entity_mapping:
-                    new_context_location = entity_mapping[relation["context_location"]]
+                # Create a new entity with all properties from the original
+                new_entity = entity.copy()
+                new_entity["id"] = new_id
+                all_entities.append(new_entity)
+            
+            entity_mapping[entity["id"]] = new_id
+        
+        # Collect and normalize relations
+        for relation in result.get("relations", []):
+            # Apply ID mapping for subject and object (skip if entity not mapped)
+            new_subject = entity_mapping.get(relation["subject"])
+            if new_subject is None:
+                continue
+            
+            new_object = entity_mapping.get(relation["object"])
+            if new_object is None:
+                continue
+            
+            # Map context time and location IDs
+            new_context_time = entity_mapping.get(relation.get("context_time"))
+            new_context_location = entity_mapping.get(relation.get("context_location"))
+            
+            # Create relation signature (for deduplication)
+            signature = (new_subject, relation["predicate"], new_object, new_context_time, new_context_location)
+            
+            if signature not in relation_signatures:
+                relation_signatures.add(signature)
+                new_relation = {
+                    "subject": new_subject,
+                    "predicate": relation["predicate"],
+                    "object": new_object,
+                    "confidence": relation["confidence"]
+                }
                 
-                # Create relation signature (for deduplication)
-                signature = f"{new_subject}_{relation['predicate']}_{new_object}"
                 if new_context_time:
-                    signature += f"_time_{new_context_time}"
+                    new_relation["context_time"] = new_context_time
                 if new_context_location:
-                    signature += f"_loc_{new_context_location}"
-                
-                if signature not in relation_signatures:
-                    relation_signatures.add(signature)
-                    new_relation = {
-                        "subject": new_subject,
-                        "predicate": relation["predicate"],
-                        "object": new_object,
-                        "confidence": relation["confidence"]
-                    }
+                    new_relation["context_location"] = new_context_location
                     
-                    if new_context_time:
-                        new_relation["context_time"] = new_context_time
-                    if new_context_location:
-                        new_relation["context_location"] = new_context_location
-                        
-                    all_relations.append(new_relation)
+                all_relations.append(new_relation)
     
     result = {
         "entities": all_entities,
@@ -362,46 +556,220 @@ def merge_and_normalize_results(results: List[Dict]) -> Dict:
 
 # Main process functions
 
-def process_chunk_based(article_data: Dict, article_date: str) -> Dict:
+async def extract_from_chunks_concurrently(chunks: List[str], article_title: str, article_date: str, aclient: AsyncOpenAI, semaphore: asyncio.Semaphore, pbar: tqdm) -> List[Dict]:
+    """
+    Extract entities and relations from all chunks concurrently.
+    The semaphore limits the requests in flight (shared across articles); results keep the chunk order.
+    """
+    async def bounded(chunk: str) -> Dict:
+        async with semaphore:
+            result = await extract_entities_relations_from_chunk(chunk, article_title, article_date, aclient)
+        pbar.update(1)
+        return result
+    
+    return await asyncio.gather(*(bounded(chunk) for chunk in chunks))
+
+async def process_chunk_based(article_data: Dict, article_date: str, chunks: List[str], aclient: AsyncOpenAI, semaphore: asyncio.Semaphore, pbar: tqdm) -> Dict:
     """
     Method 1: Chunk-based extraction + LLM entity/relation extraction
+    The article is split into chunks by the caller (see process_articles_concurrently).
     """
     print(f"Processing Method 1 (Chunk-based): {article_data['title']}")
     print(f"  Publication date: {article_date}")
-    
-    # Split into chunks
-    chunks = split_into_chunks(article_data["body"])
     print(f"  Split into {len(chunks)} chunks")
     
-    # Extract entities and relations from each chunk
-    chunk_results = []
-    for i, chunk in enumerate(tqdm(chunks, desc="Processing chunks")):
-        result = extract_entities_relations_from_chunk(chunk, article_data["title"], article_date)
-        chunk_results.append(result)
-        # Delay to respect API rate limits
-        time.sleep(1)
+    # Extract entities and relations from all chunks concurrently
+    chunk_results = await extract_from_chunks_concurrently(chunks, article_data["title"], article_date, aclient, semaphore, pbar)
     
     # Merge and normalize results
     final_result = merge_and_normalize_results(chunk_results)
     return final_result
 
-def process_summary_based(article_data: Dict, article_date: str) -> Dict:
+def run_batch_job(batch_requests: List[Dict]) -> Dict[str, str]:
+    """
+    Submit chat completion requests as one OpenAI Batch API job and wait for it to finish.
+    Returns the response text of every successful request, keyed by its custom_id.
+    """
+    # Upload the requests as a JSONL file
+    batch_input = "\n".join(json.dumps(request, ensure_ascii=False) for request in batch_requests)
+    input_file = client.files.create(file=("batch_requests.jsonl", batch_input.encode("utf-8")), purpose="batch")
+    
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"  Submitted batch {batch.id} with {len(batch_requests)} requests")
+    
+    # Poll until the batch reaches a final state
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        if counts:
+            print(f"  Batch status: {batch.status} ({counts.completed}/{counts.total} completed)")
+    
+    if batch.status != "completed":
+        print(f"  Batch {batch.id} ended with status: {batch.status}")
+    
+    # Collect the response texts (expired batches may still have partial output)
+    responses = {}
+    if batch.output_file_id:
+        output_text = client.files.content(batch.output_file_id).text
+        for line in output_text.splitlines():
+            if not line.strip():
+                continue
+            output = json.loads(line)
+            response = output.get("response") or {}
+            if response.get("status_code") == 200:
+                responses[output["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+            else:
+                print(f"  Request {output['custom_id']} failed: {output.get('error') or response.get('body')}")
+    
+    return responses
+
+def process_chunk_based_batch(articles: Dict[str, Dict], article_date: str, model: str = EXTRACTION_MODEL) -> Dict[str, Dict]:
     """
-    Method 2: LLM article summarization + LLM entity/relation extraction
+    Method 1 using the OpenAI Batch API: the chunks of all articles are submitted as a single batch job
+    (half the cost of live requests and no per-request rate limiting), then merged per article.
+    Chunks answered in a previous run are taken from the response cache and not resubmitted.
+    """
+    print(f"Processing Method 1 (Chunk-based, Batch API): {len(articles)} articles")
+    print(f"  Publication date: {article_date}")
+    
+    article_chunk_ids = {}  # article ID -> custom IDs of its chunks
+    chunk_cache_keys = {}  # custom ID -> cache key
+    response_texts = {}  # custom ID -> response text
+    batch_requests = []
+    
+    for article_id, article_data in articles.items():
+        chunks = split_into_chunks(article_data["body"])
+        article_chunk_ids[article_id] = []
+        
+        for i, chunk in enumerate(chunks):
+            custom_id = f"{article_id}_chunk_{i+1}"
+            article_chunk_ids[article_id].append(custom_id)
+            
+            messages = build_chunk_extraction_messages(chunk, article_data["title"], article_date)
+            cache_key = llm_cache_key(model, messages, CHUNK_TEMPERATURE, EXTRACTION_RESPONSE_FORMAT)
+            chunk_cache_keys[custom_id] = cache_key
+            
+            cached_text = load_cached_response(cache_key)
+            if cached_text is not None:
+                response_texts[custom_id] = cached_text
+            else:
+                batch_requests.append({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": model,
+                        "messages": messages,
+                        "temperature": CHUNK_TEMPERATURE,
+                        "max_tokens": CHUNK_MAX_TOKENS,
+                        "stop": EXTRACTION_STOP,
+                        "response_format": EXTRACTION_RESPONSE_FORMAT
+                    }
+                })
+    
+    print(f"  {len(chunk_cache_keys)} chunks in total, {len(batch_requests)} not cached")
+    if batch_requests:
+        response_texts.update(run_batch_job(batch_requests))
+    
+    # Route each chunk result back to its article
+    all_results = {}
+    for article_id, custom_ids in article_chunk_ids.items():
+        chunk_results = []
+        for custom_id in custom_ids:
+            if custom_id not in response_texts:
+                chunk_results.append({"error": "No batch response"})
+                continue
+            
+            result = parse_extraction_response(response_texts[custom_id])
+            if "error" not in result:
+                save_cached_response(chunk_cache_keys[custom_id], response_texts[custom_id])
+            chunk_results.append(result)
+        
+        all_results[article_id] = merge_and_normalize_results(chunk_results)
+    
+    return all_results
+
+async def process_summary_based(article_data: Dict, article_date: str, aclient: AsyncOpenAI, semaphore: asyncio.Semaphore) -> Tuple[Dict, str]:
+    """
+    Method 2: LLM article summarization + LLM entity/relation extraction (in one request)
     """
     print(f"Processing Method 2 (Summary-based): {article_data['title']}")
     print(f"  Publication date: {article_date}")
     
-    # Summarize the article
-    summary = summarize_article(article_data["body"], article_data["title"], article_date)
+    # Summarize the article and extract entities and relations from the summary
+    async with semaphore:
+        result, summary = await summarize_and_extract(article_data["body"], article_data["title"], article_date, aclient)
     print(f"  Summary completed: {len(summary.split())} words")
     
-    # Extract entities and relations from the summary
-    result = extract_entities_relations_from_summary(summary, article_data["title"], article_date)
     return result, summary
 
+async def process_articles_concurrently(articles: Dict[str, Dict], article_date: str, method: int, checkpoint_file) -> Dict[str, Dict]:
+    """
+    Process articles concurrently on one event loop, sharing a client and the request limit.
+    Each article is appended to the checkpoint file as soon as it finishes.
+    Progress is shown in one bar over all chunks (Method 1) or articles (Method 2).
+    Returns the checkpoint record ({"article_id", "result", "summary"?}) of every article.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    records = {}
+    
+    # Split all articles up front so the progress bar knows the total number of chunks
+    if method == 1:
+        article_chunks = {article_id: split_into_chunks(article["body"]) for article_id, article in articles.items()}
+        pbar = tqdm(total=sum(len(chunks) for chunks in article_chunks.values()), desc="Processing chunks")
+    else:
+        pbar = tqdm(total=len(articles), desc="Processing articles")
+    
+    async with create_async_client() as aclient:
+        async def process(article_id: str, article: Dict) -> Dict:
+            if method == 1:
+                result = await process_chunk_based(article, article_date, article_chunks[article_id], aclient, semaphore, pbar)
+                return {"article_id": article_id, "result": result}
+            result, summary = await process_summary_based(article, article_date, aclient, semaphore)
+            pbar.update(1)
+            return {"article_id": article_id, "result": result, "summary": summary}
+        
+        with pbar:
+            for next_done in asyncio.as_completed([process(article_id, article) for article_id, article in articles.items()]):
+                record = await next_done
+                checkpoint_file.write(orjson.dumps(record) + b"\n")
+                checkpoint_file.flush()
+                records[record["article_id"]] = record
+    
+    return records
+
+# Checkpoint of finished articles, so an interrupted run can resume
+def load_checkpoint(checkpoint_path: str) -> Dict[str, Dict]:
+    """
+    Load the articles finished by a previous (interrupted) run from a JSONL checkpoint.
+    Records with errors and partially written lines are ignored, so those articles are processed again.
+    """
+    done = {}
+    if not os.path.exists(checkpoint_path):
+        return done
+    
+    with open(checkpoint_path, 'rb') as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            if "error" not in record["result"]:
+                done[record["article_id"]] = record
+    
+    return done
+
 # Main execution code
 def main():
+    # Only warnings by default (this also keeps httpx from logging every request);
+    # call logger.setLevel(logging.DEBUG) to log every raw LLM response
+    logging.basicConfig(level=logging.WARNING)
+    
     # Newspapers directory
     newspapers_dir = os.path.join(ROOT_DIR, "newspapers")
 
@@ -412,6 +780,9 @@ def main():
     # Select method to process (1, 2)
     methods = [2]  # Change this to select the method
     
+    # Method 1 only: submit all chunks as one Batch API job (half the cost, completes within 24 hours)
+    use_batch_api = False
+    
     # Get all JSON files in the newspapers directory
     json_files = [f for f in os.listdir(newspapers_dir) if f.endswith('.json')]
     
@@ -429,8 +800,8 @@ def main():
         print(f"\n=== Processing file: {json_file} ===")
         
         # Load data
-        with open(input_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(input_file_path, 'rb') as f:
+            data = orjson.loads(f.read())
         
         # Extract metadata
         publication_date = data.get("date")
@@ -442,30 +813,47 @@ def main():
             all_results = {}
             all_summaries = {}
             
-            for i, article in enumerate(data.get("articles", [])):
-                article_id = f"article_{i+1}"
-                
-                # Process with the selected method
-                if method == 1:
-                    result = process_chunk_based(article, publication_date)
-                    all_results[article_id] = result
-                elif method == 2:
-                    result, summary = process_summary_based(article, publication_date)
-                    all_results[article_id] = result
-                    all_summaries[article_id] = summary
-                else:
+            articles = {f"article_{i+1}": article for i, article in enumerate(data.get("articles", []))}
+            
+            if method == 1 and use_batch_api:
+                # Process all articles of the file as one batch job
+                all_results = process_chunk_based_batch(articles, publication_date)
+            else:
+                if method not in (1, 2):
                     raise ValueError(f"Invalid method selection: {method}")
+                
+                # Each finished article is appended to a checkpoint right away, and skipped on restart
+                checkpoint_path = os.path.join(output_dir, f"{base_filename}_results_method{method}.jsonl")
+                done = load_checkpoint(checkpoint_path)
+                if done:
+                    print(f"Resuming: {len(done)} articles already processed")
+                
+                # Process the remaining articles concurrently with the selected method
+                pending = {article_id: article for article_id, article in articles.items() if article_id not in done}
+                with open(checkpoint_path, 'ab') as checkpoint_file:
+                    records = asyncio.run(process_articles_concurrently(pending, publication_date, method, checkpoint_file))
+                
+                # Collect the results in article order
+                for article_id in articles:
+                    record = done[article_id] if article_id in done else records[article_id]
+                    all_results[article_id] = record["result"]
+                    if "summary" in record:
+                        all_summaries[article_id] = record["summary"]
             
             # Save combined results with filename based on input file
             results_filename = f"{base_filename}_results_method{method}.json"
-            with open(os.path.join(output_dir, results_filename), 'w', encoding='utf-8') as f:
-                json.dump(all_results, f, ensure_ascii=False, indent=2)
+            with open(os.path.join(output_dir, results_filename), 'wb') as f:
+                f.write(orjson.dumps(all_results, option=orjson.OPT_INDENT_2))
+            
+            # The file is complete, so the checkpoint is no longer needed
+            if not (method == 1 and use_batch_api):
+                os.remove(checkpoint_path)
             
             # Save summaries only for method 2
             if method == 2 and all_summaries:
                 summaries_filename = f"{base_filename}_summaries_method{method}.json"
-                with open(os.path.join(output_dir, summaries_filename), 'w', encoding='utf-8') as f:
-                    json.dump(all_summaries, f, ensure_ascii=False, indent=2)
+                with open(os.path.join(output_dir, summaries_filename), 'wb') as f:
+                    f.write(orjson.dumps(all_summaries, option=orjson.OPT_INDENT_2))
             
             print(f"Results saved as {results_filename}")
             if method == 2:
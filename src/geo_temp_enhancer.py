@@ -1,15 +1,197 @@
 # geo_temp_enhancer.py
-import json
+import calendar
+import hashlib
+import orjson
 import os
+import re
+import sqlite3
+import tempfile
 import time
-from typing import Dict, List, Any, Optional, Tuple
-import requests
-import dateparser
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import httpx
 from datetime import datetime
+from dotenv import load_dotenv
+load_dotenv()
 
 # Set the root directory for relative paths
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Geocoding search endpoint. A self-hosted Nominatim (or another endpoint with the same API)
+# can be used instead of the public one, together with a higher or no rate limit
+GEOCODING_ENDPOINT = os.getenv("GEOCODING_ENDPOINT", "https://nominatim.openstreetmap.org/search")
+# Geocoding requests per second, 0 for no limit
+# (public Nominatim usage policy: at most 1 request per second)
+GEOCODING_RATE_LIMIT = float(os.getenv("GEOCODING_RATE_LIMIT", "1.0"))
+# Worker threads for geocoding, so request latency overlaps with waiting for the next slot
+GEOCODING_WORKERS = 4
+# Seconds to wait for a geocoding response
+GEOCODING_TIMEOUT = 10
+# Retries of failed connections and of rate-limited or server-side errors (with exponential backoff)
+GEOCODING_RETRIES = 3
+GEOCODING_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# Locations that are not geocoded (likely extraction or OCR noise): low confidence,
+# fewer than 3 characters or a common function word
+GEOCODING_MIN_CONFIDENCE = 0.5
+_GEO_STOPWORDS = frozenset({"da", "der", "die", "das", "the", "of", "in", "on", "le", "la", "les"})
+
+# On-disk geocoding and temporal cache shared across runs (resolutions between commits)
+GEO_CACHE_PATH = os.path.join(ROOT_DIR, ".cache", "geo", "geo_cache.sqlite")
+CACHE_SAVE_INTERVAL = 50
+
+# Version of the temporal parsing and enhancement logic; bump it whenever their output changes,
+# so cached parsed dates and enhanced articles are rebuilt (geocoding results are kept)
+CACHE_VERSION = 1
+
+# Maximum number of entries kept in memory per cache (in front of the on-disk cache)
+CACHE_CAPACITY = 5000
+
+# Normalized time expressions that are a year range (YYYY-YYYY), an ISO date (YYYY, YYYY-MM,
+# YYYY-MM-DD, optionally with a time) or a range of two ISO dates joined by "to" or "and"
+_TEMPORAL_RE = re.compile(
+    r'(?P<y>\d{4})-(?P<y2>\d{4})'
+    r'|(?P<sy>\d{4})(?:-(?P<m>\d{2})(?:-(?P<d>\d{2})(?:T[\d:]*)?)?)?'
+    r'(?: (?:to|and) (?P<ey>\d{4})(?:-(?P<m2>\d{2})(?:-(?P<d2>\d{2})(?:T[\d:]*)?)?)?)?'
+)
+# Languages tried by dateparser (instead of detecting among all supported languages)
+DATEPARSER_LANGUAGES = ['de', 'fr', 'en']
+# Texts without any digit are not passed to dateparser (it would resolve words like
+# "yesterday" or a bare month name relative to today's date)
+_FALLBACK_RE = re.compile(r'\d')
+WHITESPACE_RE = re.compile(r'\s+')
+# Processes enhancing result files in parallel (after all locations were geocoded)
+ENHANCE_WORKERS = os.cpu_count() or 1
+
+# Columns of the location and time period tables in columnar output
+LOCATION_COLUMNS = (
+    "entity_id", "latitude", "longitude", "display_name", "location_type", "importance", "osm_id",
+    "bbox_south", "bbox_north", "bbox_west", "bbox_east"
+)
+TIMEPERIOD_COLUMNS = ("entity_id", "start_date", "end_date", "precision", "type", "date_reliability")
+
+# Days per month in a non-leap year
+_MDAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _should_geocode(entity: Dict[str, Any], location_name: str) -> bool:
+    """
+    Check if a LOCATION entity is worth a geocoding request.
+    """
+    if entity.get("confidence", 1.0) < GEOCODING_MIN_CONFIDENCE:
+        return False
+    key = _canon(location_name)
+    return len(key) >= 3 and key not in _GEO_STOPWORDS
+
+def _canon(location_name: str) -> str:
+    """
+    Canonical form of a location name used as geocoding cache key,
+    so that variants like "Zürich", "zurich " and "ZURICH" share one entry.
+    """
+    return WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', location_name).casefold()).strip(' .,;:-')
+
+def _last_day_of_month(year: int, month: int) -> int:
+    """Get the last day of a month"""
+    return 29 if month == 2 and calendar.isleap(year) else _MDAYS[month - 1]
+
+def _fix_invalid_date(year: int, month: int, day: int) -> Tuple[int, int, int]:
+    """Fix invalid dates by adjusting to valid values"""
+    # Ensure month is valid
+    month = max(1, min(12, month))
+    
+    # Adjust day if it exceeds the maximum for the month
+    return year, month, min(day, _last_day_of_month(year, month))
+
+def _extract_standard_date(date_str: str) -> Optional[Dict[str, Any]]:
+    """Extract a standard ISO date (YYYY-MM-DD)"""
+    try:
+        # Fast path for complete dates, sliced without splitting
+        if (len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-'
+                and date_str[:4].isdigit() and date_str[5:7].isdigit() and date_str[8:].isdigit()):
+            year, month, day = _fix_invalid_date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:]))
+            return {
+                "date": f"{year:04d}-{month:02d}-{day:02d}",
+                "year": year,
+                "month": month,
+                "day": day
+            }
+        
+        parts = date_str.split('-')
+        year = int(parts[0])
+        month = 1
+        day = 1
+        
+        if len(parts) > 1 and parts[1].isdigit():
+            month = int(parts[1])
+        
+        if len(parts) > 2:
+            # Handle special T format for time (e.g., 05T13:00)
+            day_part = parts[2].split('T')[0]
+            if day_part.isdigit():
+                day = int(day_part)
+        
+        # Validate and fix date components
+        year, month, day = _fix_invalid_date(year, month, day)
+        
+        return {
+            "date": f"{year:04d}-{month:02d}-{day:02d}",
+            "year": year,
+            "month": month,
+            "day": day
+        }
+    except Exception as e:
+        # print(f"Error extracting standard date from '{date_str}': {e}")
+        return None
+
+class _LRU(OrderedDict):
+    """
+    Dictionary that keeps at most `cap` entries, evicting the least recently used one.
+    """
+    
+    def __init__(self, cap: int):
+        super().__init__()
+        self.cap = cap
+    
+    def get(self, key, default=None):
+        # move_to_end raises KeyError for a missing key, so a hit takes a single lookup before the read
+        try:
+            self.move_to_end(key)
+        except KeyError:
+            return default
+        return self[key]
+    
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.cap:
+            self.popitem(last=False)
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out calls to at most `rate` per second across all threads
+    (no limit if `rate` is 0).
+    """
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        """
+        Block until the caller's slot is reached.
+        """
+        with self.lock:
+            slot = max(time.monotonic(), self.next_slot)
+            self.next_slot = slot + self.interval
+        
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
 class GeoTemporalEnhancer:
     """
     Enhances extracted entity data with:
@@ -17,106 +199,280 @@ class GeoTemporalEnhancer:
     - Standardized temporal information
     """
     
-    def __init__(self):
+    def __init__(self, geocoding_cache_size: int = CACHE_CAPACITY, temporal_cache_size: int = CACHE_CAPACITY,
+                 cache_path: str = GEO_CACHE_PATH, endpoint: str = GEOCODING_ENDPOINT,
+                 rate_limit: float = GEOCODING_RATE_LIMIT, offline: bool = False):
         """
         Initialize the enhancer with optional API key for geocoding.
+        
+        Args:
+            geocoding_cache_size: Maximum number of geocoding results kept in memory
+            temporal_cache_size: Maximum number of parsed time expressions kept in memory
+            cache_path: Path of the SQLite database persisting both caches across runs
+            endpoint: Geocoding search endpoint (Nominatim API)
+            rate_limit: Geocoding requests per second, 0 for no limit
+            offline: Only use cached geocoding results and never send requests
+                (locations that are not cached are treated like failed requests)
         """
-        # Cache to avoid redundant geocoding requests
-        self.geocoding_cache = {}
-        # Cache to avoid redundant temporal parsing
-        self.temporal_cache = {}
+        # Cache to avoid redundant geocoding requests (None marks a failed request)
+        self.geocoding_cache = _LRU(geocoding_cache_size)
+        # Cache to avoid redundant temporal parsing, keyed by (text, normalized)
+        self.temporal_cache = _LRU(temporal_cache_size)
+        # Date parser for time expressions without a recognized normalized form,
+        # configured once when it is first needed (dateparser takes a few hundred ms to import)
+        self._dp = None
+        
+        # Persistent cache behind the in-memory ones
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.db = sqlite3.connect(cache_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS geocode (name TEXT PRIMARY KEY, json TEXT, ts INTEGER)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS temporal "
+            "(text TEXT, normalized TEXT, json TEXT, ts INTEGER, PRIMARY KEY (text, normalized))"
+        )
+        # Enhanced articles, keyed by a hash of the extraction results
+        self.db.execute("CREATE TABLE IF NOT EXISTS enhanced (key TEXT PRIMARY KEY, json BLOB, ts INTEGER)")
+        # Drop parsed dates and enhanced articles written by another CACHE_VERSION
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self.db.execute("DELETE FROM temporal")
+            self.db.execute("DELETE FROM enhanced")
+            self.db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self.db.commit()
+        # Shared by all geocoding threads to respect the API rate limit
+        self.endpoint = endpoint
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.offline = offline
+        # Without a rate limit (self-hosted endpoint), use as many threads as pooled connections
+        self.geocoding_workers = GEOCODING_WORKERS if rate_limit > 0 else 2 * GEOCODING_WORKERS
+        
+        # Keep-alive HTTP/2 client shared by all geocoding threads
+        # (requests to the same host are multiplexed over one TLS connection)
+        self._client = httpx.Client(
+            headers={'User-Agent': 'HistoricalEntityExtraction/1.0'},
+            timeout=GEOCODING_TIMEOUT,
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=GEOCODING_RETRIES,
+                limits=httpx.Limits(max_connections=2 * GEOCODING_WORKERS)
+            )
+        )
+    
+    def close(self) -> None:
+        """
+        Commit pending cache entries and close the cache database and the HTTP client.
+        """
+        self.db.commit()
+        self.db.close()
+        self._client.close()
+    
+    def _geocode_many(self, location_names: List[str]) -> int:
+        """
+        Geocode locations and store the results in the geocoding cache (keyed by canonical name).
+        Locations found in the on-disk cache are read from it, the others are geocoded concurrently.
+        Failed requests are cached in memory only, so they are retried on the next run.
+        
+        Args:
+            location_names: Location names that are not cached in memory
+            
+        Returns:
+            Number of locations requested from the geocoding API
+        """
+        # Canonical name -> first original name, which is sent to the geocoding API
+        to_fetch = {}
+        for location_name in location_names:
+            key = _canon(location_name)
+            if key in to_fetch:
+                continue
+            row = self.db.execute("SELECT json FROM geocode WHERE name = ?", (key,)).fetchone()
+            if row:
+                self.geocoding_cache.put(key, orjson.loads(row[0]))
+            else:
+                to_fetch[key] = location_name
+        
+        if not to_fetch:
+            return 0
+        
+        if self.offline:
+            for key in to_fetch:
+                self.geocoding_cache.put(key, None)
+            return 0
+        
+        def geocode(item: Tuple[str, str]) -> Tuple[str, Dict[str, Any]]:
+            key, location_name = item
+            return key, self.geocode_location(location_name)
+        
+        with ThreadPoolExecutor(max_workers=self.geocoding_workers) as executor:
+            for key, geo_data in executor.map(geocode, to_fetch.items()):
+                self.geocoding_cache.put(key, geo_data)
+                if geo_data is not None:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO geocode (name, json, ts) VALUES (?, ?, ?)",
+                        (key, orjson.dumps(geo_data), int(time.time()))
+                    )
+        self.db.commit()
+        return len(to_fetch)
+    
+    def _temporal_info(self, text: str, normalized: str) -> Dict[str, Any]:
+        """
+        Get the parsed temporal information of a time expression from the caches, parsing it on a miss.
+        """
+        normalized = normalized.strip()
+        temporal_key = (text, normalized)
+        temporal_info = self.temporal_cache.get(temporal_key)
+        if temporal_info is not None:
+            return temporal_info
+        
+        row = self.db.execute(
+            "SELECT json FROM temporal WHERE text = ? AND normalized = ?", temporal_key
+        ).fetchone()
+        if row:
+            temporal_info = orjson.loads(row[0])
+        else:
+            temporal_info = self.parse_temporal_info(text, normalized)
+            self.db.execute(
+                "INSERT OR REPLACE INTO temporal (text, normalized, json, ts) VALUES (?, ?, ?, ?)",
+                (text, normalized, orjson.dumps(temporal_info), int(time.time()))
+            )
+        
+        self.temporal_cache.put(temporal_key, temporal_info)
+        return temporal_info
     
-    def enhance_results(self, extraction_results: Dict[str, Any]) -> Dict[str, Any]:
+    def _collect_unique(self, articles: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[Tuple[str, str], None]]:
+        """
+        Collect the unique locations (canonical name -> first original name)
+        and (text, normalized) time expressions of all articles.
+        """
+        location_names = {}
+        temporal_keys = {}
+        for article in articles:
+            for entity in article.get("entities", []):
+                if entity.get("type", "") == "LOCATION":
+                    location_name = entity.get("normalized", entity["text"])
+                    if _should_geocode(entity, location_name):
+                        location_names.setdefault(_canon(location_name), location_name)
+                elif entity.get("type", "") == "TIME":
+                    temporal_keys[(entity["text"], entity.get("normalized", ""))] = None
+        return location_names, temporal_keys
+    
+    def prefetch(self, articles: Iterable[Dict[str, Any]]) -> None:
+        """
+        Resolve the unique locations and time expressions of all articles once, before enhancing them.
+        Results are committed to the on-disk cache in batches, so an interrupted run resumes where it stopped.
+        
+        Args:
+            articles: Extraction results of all articles
+        """
+        location_names, temporal_keys = self._collect_unique(articles)
+        
+        # Sorted, so similar names are requested together
+        missing = [location_names[key] for key in sorted(location_names) if key not in self.geocoding_cache]
+        fetched = 0
+        for i in range(0, len(missing), CACHE_SAVE_INTERVAL):
+            fetched += self._geocode_many(missing[i:i + CACHE_SAVE_INTERVAL])
+        print(f"Geocoded {fetched} new locations ({len(location_names)} unique)")
+        
+        for text, normalized in temporal_keys:
+            self._temporal_info(text, normalized)
+        self.db.commit()
+    
+    def _geo_data(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the cached geographic information of a LOCATION entity (empty if not geocoded or not found).
+        """
+        # Get the normalized location name if available, otherwise use the text
+        # (all locations worth geocoding were geocoded before)
+        location_name = entity.get("normalized", entity["text"])
+        if not _should_geocode(entity, location_name):
+            return {}
+        return self.geocoding_cache.get(_canon(location_name)) or {}
+    
+    def _process_locations(self, location_entities: List[Dict[str, Any]], columnar: bool = False) -> Any:
+        """
+        Build the location attribute table (one row per LOCATION entity, with coordinates if geocoding succeeded).
+        """
+        geo_data = [self._geo_data(entity) for entity in location_entities]
+        return _build_table(location_entities, geo_data, LOCATION_COLUMNS if columnar else None)
+    
+    def _process_times(self, time_entities: List[Dict[str, Any]], columnar: bool = False) -> Any:
+        """
+        Build the time period attribute table (one row per TIME entity).
+        """
+        # Check caches or parse the temporal info
+        # (the text is part of the key, as it is parsed when the normalized form isn't recognized)
+        temporal_data = [
+            self._temporal_info(entity["text"], entity.get("normalized", ""))
+            for entity in time_entities
+        ]
+        return _build_table(time_entities, temporal_data, TIMEPERIOD_COLUMNS if columnar else None)
+    
+    def enhance_results(self, extraction_results: Dict[str, Any], columnar: bool = False) -> Dict[str, Any]:
         """
         Enhance the extraction results with geospatial and temporal information
         using the unified entity ID system.
+        The result is cached on disk by the content of the extraction results, so unchanged
+        articles are returned directly on reruns (unless a geocoding request for them failed).
         
         Args:
             extraction_results: The original extraction results
+            columnar: Return the location and time period tables as dictionaries of column lists
+                (missing values are None, e.g. for pandas.DataFrame or pyarrow.Table.from_pydict)
+                instead of lists of rows
             
         Returns:
             Enhanced results with additional geospatial and temporal data
         """
+        # The output also depends on the code version, the geocoding threshold and the endpoint
+        key = hashlib.blake2b(
+            orjson.dumps(
+                [CACHE_VERSION, GEOCODING_MIN_CONFIDENCE, self.endpoint, extraction_results, columnar],
+                option=orjson.OPT_SORT_KEYS
+            )
+        ).hexdigest()
+        row = self.db.execute("SELECT json FROM enhanced WHERE key = ?", (key,)).fetchone()
+        if row:
+            return orjson.loads(row[0])
+        
+        enhanced_results = self._enhance(extraction_results, columnar)
+        
+        # Don't keep results with failed geocoding requests, so they are retried on the next run
+        location_names, _ = self._collect_unique([extraction_results])
+        if not any(self.geocoding_cache.get(name_key, {}) is None for name_key in location_names):
+            self.db.execute(
+                "INSERT OR REPLACE INTO enhanced (key, json, ts) VALUES (?, ?, ?)",
+                (key, orjson.dumps(enhanced_results), int(time.time()))
+            )
+        
+        # Persist newly parsed time expressions and the enhanced result
+        self.db.commit()
+        return enhanced_results
+    
+    def _enhance(self, extraction_results: Dict[str, Any], columnar: bool) -> Dict[str, Any]:
+        """
+        Enhance the extraction results (see enhance_results).
+        """
         enhanced_results = extraction_results.copy()
         
         if "entities" in enhanced_results:
-            # Create empty lists for specialized attribute tables
-            locations_data = []
-            timeperiods_data = []
+            entities = enhanced_results["entities"]
             
-            # Process all entities
-            enhanced_entities = []
-            for entity in enhanced_results["entities"]:
-                # Copy the original entity but keep only the basic fields
-                enhanced_entity = {
-                    "id": entity["id"],
-                    "type": entity["type"],
-                    "text": entity["text"],
-                    "confidence": entity["confidence"]
-                }
-                
-                # Keep the normalized field if it exists
-                if "normalized" in entity:
-                    enhanced_entity["normalized"] = entity["normalized"]
-                
-                entity_type = entity.get("type", "")
-
-                # Process LOCATION entities
-                if entity_type == "LOCATION":
-                    # Get the normalized location name if available, otherwise use the text
-                    location_name = entity.get("normalized", entity["text"])
-                    
-                    # Create basic location_attributes (basic info that will always be added)
-                    location_attributes = {
-                        "entity_id": entity["id"]
-                    }
-                    
-                    # Check cache or geocode the location
-                    if location_name in self.geocoding_cache:
-                        geo_data = self.geocoding_cache[location_name]
-                    else:
-                        geo_data = self.geocode_location(location_name)
-                        self.geocoding_cache[location_name] = geo_data
-                    
-                    # Add coordinate information if geocoding was successful
-                    if geo_data:
-                        # Add all geographic attributes to location_attributes
-                        for key, value in geo_data.items():
-                            location_attributes[key] = value
-                    
-                    # Always add to locations_data regardless of geocoding success
-                    locations_data.append(location_attributes)
-                    
-                    # Sleep to respect API rate limits
-                    time.sleep(0.1)
-                
-                # Process TIME entities
-                elif entity_type == "TIME":
-                    # Get the normalized date/time expression
-                    normalized = entity.get("normalized", "")
-                    
-                    # Check cache or parse the temporal info
-                    if normalized in self.temporal_cache:
-                        temporal_enhancements = self.temporal_cache[normalized]
-                    else:
-                        temporal_enhancements = self.parse_temporal_info(
-                            entity["text"], 
-                            normalized
-                        )
-                        self.temporal_cache[normalized] = temporal_enhancements
-                    
-                    # Add time information only to timeperiods_data, not to enhanced_entity
-                    time_attributes = {
-                        "entity_id": entity["id"]
-                    }
-                    
-                    # Add all temporal attributes to time_attributes
-                    for key, value in temporal_enhancements.items():
-                        time_attributes[key] = value
-                    
-                    timeperiods_data.append(time_attributes)
-                
-                enhanced_entities.append(enhanced_entity)
+            # Geocode all locations that are not cached yet in one concurrent pass
+            location_names, _ = self._collect_unique([enhanced_results])
+            missing = [name for key, name in location_names.items() if key not in self.geocoding_cache]
+            if missing:
+                self._geocode_many(missing)
+            
+            # Copy the original entities but keep only the basic fields
+            enhanced_entities = list(map(_base_entity, entities))
+            
+            # Build the specialized attribute tables from the LOCATION and TIME entities
+            locations_data = self._process_locations(
+                [entity for entity in entities if entity.get("type", "") == "LOCATION"], columnar
+            )
+            timeperiods_data = self._process_times(
+                [entity for entity in entities if entity.get("type", "") == "TIME"], columnar
+            )
             
             # Update the entities list
             enhanced_results["entities"] = enhanced_entities
@@ -138,27 +494,35 @@ class GeoTemporalEnhancer:
             location_name: The name of the location to geocode
             
         Returns:
-            Dictionary with geographic information
+            Dictionary with geographic information (empty if the location was not found),
+            or None if the request failed
         """
         # Current implementation remains the same as before
         try:
             # Using Nominatim API (OpenStreetMap)
-            headers = {'User-Agent': 'HistoricalEntityExtraction/1.0'}
-            
+            # Only the fields of the first match that are used below are requested
             params = {
                 'q': location_name,
                 'format': 'json',
-                'limit': 1
+                'limit': 1,
+                'addressdetails': 0,
+                'extratags': 0,
+                'namedetails': 0
             }
             
-            response = requests.get(
-                'https://nominatim.openstreetmap.org/search',
-                headers=headers,
-                params=params
-            )
+            # Retry rate-limited and server-side errors with backoff
+            # (failed connections are retried by the transport)
+            for attempt in range(GEOCODING_RETRIES + 1):
+                # Every attempt takes a rate limiter slot; the backoff below is an extra delay on top of it
+                self.rate_limiter.wait()
+                response = self._client.get(self.endpoint, params=params)
+                if response.status_code not in GEOCODING_RETRY_STATUS or attempt == GEOCODING_RETRIES:
+                    break
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.isdigit() else 0.5 * 2 ** attempt)
             
             if response.status_code == 200:
-                results = response.json()
+                results = orjson.loads(response.content)
                 if results:
                     result = results[0]
                     flattened_data = {
@@ -171,18 +535,30 @@ class GeoTemporalEnhancer:
                     }
                     
                     if "boundingbox" in result:
-                        flattened_data["bbox_south"] = float(result["boundingbox"][0])
-                        flattened_data["bbox_north"] = float(result["boundingbox"][1])
-                        flattened_data["bbox_west"] = float(result["boundingbox"][2])
-                        flattened_data["bbox_east"] = float(result["boundingbox"][3])
+                        south, north, west, east = map(float, result["boundingbox"])
+                        flattened_data.update(
+                            bbox_south=south, bbox_north=north, bbox_west=west, bbox_east=east
+                        )
                     
                     return flattened_data
+                
+                return {}
             
-            return {}
+            print(f"Error geocoding location '{location_name}': HTTP {response.status_code}")
+            return None
             
         except Exception as e:
             print(f"Error geocoding location '{location_name}': {e}")
-            return {}
+            return None
+    
+    def _date_parser(self):
+        """
+        Get the date parser, importing and creating it on first use.
+        """
+        if self._dp is None:
+            from dateparser.date import DateDataParser
+            self._dp = DateDataParser(languages=DATEPARSER_LANGUAGES, settings={'STRICT_PARSING': False})
+        return self._dp
     
     def parse_temporal_info(self, text: str, normalized: str) -> Dict[str, Any]:
         """
@@ -202,140 +578,111 @@ class GeoTemporalEnhancer:
             "date_reliability": 0.7
         }
         
-        def get_last_day_of_month(year, month):
-            """Helper function to get the last day of a month"""
-            if month == 2:
-                if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
-                    return 29
-                else:
-                    return 28
-            elif month in [4, 6, 9, 11]:
-                return 30
-            else:
-                return 31
-        
-        def fix_invalid_date(year, month, day):
-            """Fix invalid dates by adjusting to valid values"""
-            # Ensure month is valid
-            month = max(1, min(12, month))
-            
-            # Ensure day is valid for the given month
-            max_day = get_last_day_of_month(year, month)
-
-            # Adjust day if it exceeds the maximum for the month
-            if day > max_day:
-                day = max_day 
-            
-            return year, month, day
-        
-        def extract_standard_date(date_str):
-            """Extract a standard ISO date (YYYY-MM-DD)"""
-            try:
-                parts = date_str.split('-')
-                year = int(parts[0])
-                month = 1
-                day = 1
-                
-                if len(parts) > 1 and parts[1].isdigit():
-                    month = int(parts[1])
-                
-                if len(parts) > 2:
-                    # Handle special T format for time (e.g., 05T13:00)
-                    day_part = parts[2].split('T')[0]
-                    if day_part.isdigit():
-                        day = int(day_part)
-                
-                # Validate and fix date components
-                year, month, day = fix_invalid_date(year, month, day)
-                
-                return {
-                    "date": f"{year:04d}-{month:02d}-{day:02d}",
-                    "year": year,
-                    "month": month,
-                    "day": day
-                }
-            except Exception as e:
-                # print(f"Error extracting standard date from '{date_str}': {e}")
-                return None
-        
         # Main processing starts here
         if normalized:
             # Remove any leading text before actual dates
             if "approximately " in normalized:
                 normalized = normalized.replace("approximately ", "")
             
+            # ISO dates, ISO date ranges and year ranges are dispatched on the matched groups
+            # (other forms are handled by the cases below)
+            match = _TEMPORAL_RE.fullmatch(normalized)
+            if match:
+                # Simple year range (YYYY-YYYY)
+                if match["y2"]:
+                    result["start_date"] = f"{int(match['y']):04d}-01-01"
+                    result["end_date"] = f"{int(match['y2']):04d}-12-31"
+                    result["precision"] = "YEAR"
+                    result["type"] = "PERIOD"
+                    result["date_reliability"] = 0.85
+                    return result
+                
+                year = int(match["sy"])
+                
+                # Date range with "to" or "and" (missing months and days count as 1)
+                if match["ey"]:
+                    year, month, day = _fix_invalid_date(year, int(match["m"] or 1), int(match["d"] or 1))
+                    end_year, end_month, end_day = _fix_invalid_date(
+                        int(match["ey"]), int(match["m2"] or 1), int(match["d2"] or 1)
+                    )
+                    result["start_date"] = f"{year:04d}-{month:02d}-{day:02d}"
+                    result["end_date"] = f"{end_year:04d}-{end_month:02d}-{end_day:02d}"
+                    if match["d"] and match["d2"]:
+                        result["precision"] = "DAY"
+                    elif match["m"] and match["m2"]:
+                        result["precision"] = "MONTH"
+                    else:
+                        result["precision"] = "YEAR"
+                    result["type"] = "PERIOD"
+                    result["date_reliability"] = 0.85
+                
+                # Standard ISO date (YYYY-MM-DD), optionally with a time
+                elif match["d"]:
+                    year, month, day = _fix_invalid_date(year, int(match["m"]), int(match["d"]))
+                    result["start_date"] = f"{year:04d}-{month:02d}-{day:02d}"
+                    result["end_date"] = result["start_date"]
+                    result["precision"] = "DAY"
+                    result["type"] = "POINT"
+                    result["date_reliability"] = 0.9
+                
+                # Year-month (YYYY-MM)
+                elif match["m"]:
+                    # Validate month
+                    month = max(1, min(12, int(match["m"])))
+                    result["start_date"] = f"{year:04d}-{month:02d}-01"
+                    result["end_date"] = f"{year:04d}-{month:02d}-{_last_day_of_month(year, month):02d}"
+                    result["precision"] = "MONTH"
+                    result["type"] = "PERIOD"
+                    result["date_reliability"] = 0.85
+                
+                # Year only (YYYY)
+                else:
+                    result["start_date"] = f"{year:04d}-01-01"
+                    result["end_date"] = f"{year:04d}-12-31"
+                    result["precision"] = "YEAR"
+                    result["type"] = "PERIOD"
+                    result["date_reliability"] = 0.8
+                return result
+            
             # Case 1: Handle date ranges with "to" or "and"
+            # (the parts are validated by _extract_standard_date, so nothing here can raise)
             for separator in [" to ", " and "]:
                 if separator in normalized:
-                    try:
-                        start_part, end_part = normalized.split(separator)
-                        
-                        # Extract start date
-                        start_date = extract_standard_date(start_part.strip())
-                        if not start_date:
-                            continue
-                        
-                        # Extract end date
-                        end_date = extract_standard_date(end_part.strip())
-                        if not end_date:
-                            continue
-                        
-                        # Set date range
-                        result["start_date"] = start_date["date"]
-                        result["end_date"] = end_date["date"]
-                        
-                        # Determine precision
-                        if len(start_part.split('-')) > 2 and len(end_part.split('-')) > 2:
-                            result["precision"] = "DAY"
-                        elif len(start_part.split('-')) > 1 and len(end_part.split('-')) > 1:
-                            result["precision"] = "MONTH"
-                        else:
-                            result["precision"] = "YEAR"
-                        
-                        result["type"] = "PERIOD"
-                        result["date_reliability"] = 0.85
-                        return result
-                    except Exception as e:
+                    parts = normalized.split(separator)
+                    if len(parts) != 2:
                         # This separator didn't work, try the next one
                         continue
-            
-            # Case 2: Handle ISO timestamps with T
-            if 'T' in normalized:
-                try:
-                    date_part = normalized.split('T')[0]
-                    time_part = normalized.split('T')[1]
+                    start_part, end_part = parts
+                    
+                    # Extract start date
+                    start_date = _extract_standard_date(start_part.strip())
+                    if not start_date:
+                        continue
                     
-                    date_info = extract_standard_date(date_part)
-                    if date_info:
-                        result["start_date"] = date_info["date"]
-                        result["end_date"] = date_info["date"]
+                    # Extract end date
+                    end_date = _extract_standard_date(end_part.strip())
+                    if not end_date:
+                        continue
+                    
+                    # Set date range
+                    result["start_date"] = start_date["date"]
+                    result["end_date"] = end_date["date"]
+                    
+                    # Determine precision
+                    if len(start_part.split('-')) > 2 and len(end_part.split('-')) > 2:
                         result["precision"] = "DAY"
-                        result["type"] = "POINT"
-                        result["date_reliability"] = 0.9
-                        return result
-                except Exception as e:
-                    # Continue to next case
-                    pass
-            
-            # Case 3: Simple year range (YYYY-YYYY)
-            if len(normalized) == 9 and normalized[4] == '-' and normalized[:4].isdigit() and normalized[5:].isdigit():
-                try:
-                    start_year = int(normalized[:4])
-                    end_year = int(normalized[5:])
+                    elif len(start_part.split('-')) > 1 and len(end_part.split('-')) > 1:
+                        result["precision"] = "MONTH"
+                    else:
+                        result["precision"] = "YEAR"
                     
-                    result["start_date"] = f"{start_year:04d}-01-01"
-                    result["end_date"] = f"{end_year:04d}-12-31"
-                    result["precision"] = "YEAR"
                     result["type"] = "PERIOD"
                     result["date_reliability"] = 0.85
                     return result
-                except Exception as e:
-                    # Continue to next case
-                    pass
             
-            # Case 4: Standard ISO date (YYYY-MM-DD)
-            if len(normalized) >= 10 and normalized[4] == '-' and normalized[7] == '-':
-                date_info = extract_standard_date(normalized)
+            # Case 2: Handle ISO timestamps with T
+            if 'T' in normalized:
+                date_info = _extract_standard_date(normalized.split('T', 1)[0])
                 if date_info:
                     result["start_date"] = date_info["date"]
                     result["end_date"] = date_info["date"]
@@ -344,45 +691,20 @@ class GeoTemporalEnhancer:
                     result["date_reliability"] = 0.9
                     return result
             
-            # Case 5: Year-month (YYYY-MM)
-            if len(normalized) == 7 and normalized[4] == '-' and normalized[:4].isdigit() and normalized[5:].isdigit():
-                try:
-                    year = int(normalized[:4])
-                    month = int(normalized[5:])
-                    
-                    # Validate month
-                    month = max(1, min(12, month))
-                    
-                    # Calculate last day of month
-                    last_day = get_last_day_of_month(year, month)
-                    
-                    result["start_date"] = f"{year:04d}-{month:02d}-01"
-                    result["end_date"] = f"{year:04d}-{month:02d}-{last_day:02d}"
-                    result["precision"] = "MONTH"
-                    result["type"] = "PERIOD"
-                    result["date_reliability"] = 0.85
-                    return result
-                except Exception as e:
-                    # Continue to next case
-                    pass
-            
-            # Case 6: Year only (YYYY)
-            if len(normalized) == 4 and normalized.isdigit():
-                try:
-                    year = int(normalized)
-                    result["start_date"] = f"{year:04d}-01-01"
-                    result["end_date"] = f"{year:04d}-12-31"
-                    result["precision"] = "YEAR"
-                    result["type"] = "PERIOD"
-                    result["date_reliability"] = 0.8
+            # Case 4: Standard ISO date (YYYY-MM-DD)
+            if len(normalized) >= 10 and normalized[4] == '-' and normalized[7] == '-':
+                date_info = _extract_standard_date(normalized)
+                if date_info:
+                    result["start_date"] = date_info["date"]
+                    result["end_date"] = date_info["date"]
+                    result["precision"] = "DAY"
+                    result["type"] = "POINT"
+                    result["date_reliability"] = 0.9
                     return result
-                except Exception as e:
-                    # Continue to next case
-                    pass
         
         # If none of the patterns matched, try dateparser on the original text
         try:
-            parsed_date = dateparser.parse(text)
+            parsed_date = self._date_parser().get_date_data(text).date_obj if _FALLBACK_RE.search(text) else None
             if parsed_date:
                 iso_date = parsed_date.strftime("%Y-%m-%d")
                 result["start_date"] = iso_date
@@ -394,28 +716,153 @@ class GeoTemporalEnhancer:
             # Fallback to text analysis
             pass
         
-        # Analyze text content for additional clues
-        if text:
-            if "month" in text.lower() or "monthly" in text.lower():
-                if "precision" not in result or result["precision"] == "UNKNOWN":
-                    result["precision"] = "MONTH"
-                    result["type"] = "PERIOD"
-            
-            if "year" in text.lower() or "annual" in text.lower() or "wartime" in text.lower():
-                if "precision" not in result or result["precision"] == "UNKNOWN":
-                    result["precision"] = "YEAR"
-                    result["type"] = "PERIOD"
+        # Analyze text content for additional clues (only if no date could be parsed)
+        if text and result["precision"] == "UNKNOWN":
+            lowered = text.lower()
+            # "month" also covers "monthly"
+            if "month" in lowered:
+                result["precision"] = "MONTH"
+                result["type"] = "PERIOD"
+            elif "year" in lowered or "annual" in lowered or "wartime" in lowered:
+                result["precision"] = "YEAR"
+                result["type"] = "PERIOD"
         
         return result
 
+def _base_entity(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy the basic fields of an entity (and the normalized field if it exists).
+    """
+    enhanced_entity = {
+        "id": entity["id"],
+        "type": entity["type"],
+        "text": entity["text"],
+        "confidence": entity["confidence"]
+    }
+    if "normalized" in entity:
+        enhanced_entity["normalized"] = entity["normalized"]
+    return enhanced_entity
+
+def _build_table(entities: List[Dict[str, Any]], attributes: List[Dict[str, Any]],
+                 columns: Optional[Tuple[str, ...]] = None) -> Any:
+    """
+    Build an attribute table from entities and their attributes: a list of rows
+    ({"entity_id": ..., **attributes}), or a dictionary of column lists (None for missing values)
+    if columns are given.
+    """
+    if columns is None:
+        rows = []
+        for entity, entity_attributes in zip(entities, attributes):
+            row = {"entity_id": entity["id"]}
+            row.update(entity_attributes)
+            rows.append(row)
+        return rows
+    
+    table = {"entity_id": [entity["id"] for entity in entities]}
+    for column in columns[1:]:
+        table[column] = [entity_attributes.get(column) for entity_attributes in attributes]
+    return table
+
+def is_article_dict(data: Any) -> bool:
+    """
+    Check if result data is a dictionary of articles (article_id -> extraction result).
+    """
+    return isinstance(data, dict) and all(isinstance(value, dict) for value in data.values())
+
+def load_result_file(path: str) -> Any:
+    """
+    Load an extraction result file.
+    """
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def write_enhanced_articles(path: str, articles) -> None:
+    """
+    Write enhanced articles to a JSON object file one at a time, so they don't have to be kept in memory.
+    The output is formatted like a 2-space indented dump of the whole dictionary.
+    The file is written atomically, so an article failing partway through leaves no truncated output.
+    
+    Args:
+        path: Output file path
+        articles: Iterable of (article_id, enhanced article) pairs
+    """
+    # The temporary file is in the same directory (for os.replace) and not matched by "*.json"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            separator = b"{\n  "
+            for article_id, article in articles:
+                # Nest the article's own indentation one level deeper (JSON strings contain no raw newlines)
+                article_json = orjson.dumps(article, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  ")
+                f.write(separator + orjson.dumps(article_id) + b": " + article_json)
+                separator = b",\n  "
+            f.write(b"\n}" if separator != b"{\n  " else b"{}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def get_articles(data: Any) -> List[Dict[str, Any]]:
+    """
+    Get the extraction results of all articles in a result file.
+    """
+    if is_article_dict(data):
+        return list(data.values())
+    # Single article or different structure
+    return [data]
+
+def process_file(result_file: str, input_dir: str, output_dir: str) -> str:
+    """
+    Enhance one extraction result file (run in a worker process).
+    Uses only the cached geocoding results, so the workers never exceed the geocoding rate limit.
+    
+    Args:
+        result_file: Name of the result file in input_dir
+        input_dir: Directory of the extraction result files
+        output_dir: Directory of the enhanced result files
+        
+    Returns:
+        Name of the output file
+    """
+    # Extract base filename and method number
+    # Example: "NZZ_19150405_results_method2.json" -> "NZZ_19150405" and "2"
+    filename_parts = result_file.split('_results_method')
+    base_filename = filename_parts[0]
+    method_num = filename_parts[1].split('.')[0]
+    
+    # Create output filename
+    output_filename = f"{base_filename}_method{method_num}.json"
+    output_file_path = os.path.join(output_dir, output_filename)
+    
+    enhancer = GeoTemporalEnhancer(offline=True)
+    try:
+        # Load input data
+        data = load_result_file(os.path.join(input_dir, result_file))
+        
+        # Check if the structure is a dictionary of articles
+        if is_article_dict(data):
+            # Process each article and write it out right away
+            write_enhanced_articles(
+                output_file_path,
+                ((article_id, enhancer.enhance_results(article_data)) for article_id, article_data in data.items())
+            )
+        else:
+            # Single article or different structure
+            enhanced_data = enhancer.enhance_results(data)
+            
+            # Save enhanced data
+            with open(output_file_path, 'wb') as f:
+                f.write(orjson.dumps(enhanced_data, option=orjson.OPT_INDENT_2))
+    finally:
+        enhancer.close()
+    
+    return output_filename
+
 def enhance_extraction_results():
     """
     Enhance extraction results with geospatial and temporal information
     for all files in the extracted_results folder.
     """
-    # Create enhancer
-    enhancer = GeoTemporalEnhancer()
-    
     # Define input and output directories
     input_dir = os.path.join(ROOT_DIR, "extracted_results")
     output_dir = os.path.join(ROOT_DIR, "enhanced_results")
@@ -430,41 +877,26 @@ def enhance_extraction_results():
     
     print(f"Found {len(result_files)} result files to process")
     
-    # Process each result file
-    for result_file in result_files:
-        input_file_path = os.path.join(input_dir, result_file)
-        
-        # Extract base filename and method number
-        # Example: "NZZ_19150405_results_method2.json" -> "NZZ_19150405" and "2"
-        filename_parts = result_file.split('_results_method')
-        base_filename = filename_parts[0]
-        method_num = filename_parts[1].split('.')[0]
-        
-        # Create output filename
-        output_filename = f"{base_filename}_method{method_num}.json"
-        output_file_path = os.path.join(output_dir, output_filename)
-        
-        print(f"\n=== Processing file: {result_file} ===")
-        
-        # Load input data
-        with open(input_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Check if the structure is a dictionary of articles
-        if isinstance(data, dict) and all(isinstance(value, dict) for value in data.values()):
-            # Process each article
-            enhanced_data = {}
-            for article_id, article_data in data.items():
-                enhanced_data[article_id] = enhancer.enhance_results(article_data)
-        else:
-            # Single article or different structure
-            enhanced_data = enhancer.enhance_results(data)
-        
-        # Save enhanced data
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"Enhanced data saved to {output_filename}")
+    # Create enhancer (reuses the on-disk cache of previous runs)
+    enhancer = GeoTemporalEnhancer()
+    
+    try:
+        # Resolve the locations and time expressions of all articles at once
+        # (files are read one at a time, here and again by the workers)
+        enhancer.prefetch(
+            article
+            for result_file in result_files
+            for article in get_articles(load_result_file(os.path.join(input_dir, result_file)))
+        )
+    finally:
+        # Write pending cache entries and release the database and HTTP connections
+        enhancer.close()
+    
+    # Enhance the result files in parallel from the cache
+    with ProcessPoolExecutor(max_workers=min(ENHANCE_WORKERS, len(result_files))) as executor:
+        outputs = executor.map(process_file, result_files, repeat(input_dir), repeat(output_dir))
+        for result_file, output_filename in zip(result_files, outputs):
+            print(f"Enhanced {result_file} -> {output_filename}")
     
     print(f"\nAll files processed! Enhanced results saved in: {output_dir}")
 
@@ -1,16 +1,37 @@
 # global_entity_integrator.py
-import json
 import os
+import orjson
 import glob
 from typing import Dict, List, Any, Tuple, Set
 import hashlib
-from difflib import SequenceMatcher
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import chain
 from math import radians, sin, cos, sqrt, atan2
 import csv
+from rapidfuzz import fuzz
 
 # Set the root directory for relative paths
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+def _text_key(entity):
+    """Lowercased normalized text (or text) used for similarity comparisons"""
+    return entity.get("normalized", entity["text"]).lower()
+
+@lru_cache(maxsize=1 << 16, typed=True)
+def _decimal_places(value):
+    """Number of decimal places of a coordinate as written (cached, coordinates recur across merges)"""
+    text = str(value)
+    return len(text.rpartition('.')[2]) if '.' in text else 0
+
+def _public_record(record):
+    """
+    Copy of a global entity or relation without the internal fields (prefixed with "_"),
+    with its sources as a list (they are kept as an insertion-ordered dict for O(1) lookups)
+    """
+    return {k: (list(v) if k == "sources" else v) for k, v in record.items() if not k.startswith("_")}
+
 class GlobalEntityIntegrator:
     """
     Class for integrating entities extracted from multiple documents
@@ -19,7 +40,10 @@ class GlobalEntityIntegrator:
     
     def __init__(self, debug_mode=False):
         self.global_entities = {}  # global_id -> entity
+        self._by_type = defaultdict(list)  # entity type -> global_ids (in insertion order)
+        self._exact_index = {}  # (entity type, text key) -> global_id of the first entity with that text
         self.global_relations = []
+        self._relation_by_sig = {}  # relation signature -> global relation
         self.id_mapping = {}  # (article_id, original_id) -> global_id
         self.debug_mode = debug_mode
         
@@ -38,8 +62,8 @@ class GlobalEntityIntegrator:
         else:
             base = f"{entity_type}_{normalized_text.lower().replace(' ', '_')}"
         
-        # Create hash-based unique ID
-        return hashlib.md5(base.encode()).hexdigest()[:12]
+        # Create hash-based unique ID (12 hex characters)
+        return hashlib.blake2b(base.encode(), digest_size=6).hexdigest()
         
     def are_entities_similar(self, entity1, entity2, threshold=0.8):
         """Determine if two entities are semantically identical"""
@@ -50,7 +74,8 @@ class GlobalEntityIntegrator:
         # Compare based on entity type
         if entity1["type"] == "LOCATION":
             # Compare based on coordinates
-            if all(k in entity1 and k in entity2 for k in ["latitude", "longitude"]):
+            # (plain membership tests, this check runs for every LOCATION candidate)
+            if "latitude" in entity1 and "longitude" in entity1 and "latitude" in entity2 and "longitude" in entity2:
                 # Calculate distance using Haversine formula
                 R = 6371  # Earth radius (km)
                 lat1, lon1 = radians(entity1["latitude"]), radians(entity1["longitude"])
@@ -74,12 +99,18 @@ class GlobalEntityIntegrator:
             if "normalized" in entity1 and "normalized" in entity2:
                 return entity1["normalized"] == entity2["normalized"]
         
-        # Compare text similarity
-        normalized1 = entity1.get("normalized", entity1["text"]).lower()
-        normalized2 = entity2.get("normalized", entity2["text"]).lower()
+        # Compare text similarity (global entities keep their comparison key in "_text_key")
+        normalized1 = entity1["_text_key"] if "_text_key" in entity1 else _text_key(entity1)
+        normalized2 = entity2["_text_key"] if "_text_key" in entity2 else _text_key(entity2)
+        
+        # The similarity is at most 2 * min(len) / (len1 + len2), so strings of very different lengths can't match
+        len1, len2 = len(normalized1), len(normalized2)
+        if 2 * (len1 if len1 < len2 else len2) < threshold * (len1 + len2):
+            return False
         
-        similarity = SequenceMatcher(None, normalized1, normalized2).ratio()
-        return similarity >= threshold
+        # Indel similarity in C (scores below the cutoff are returned as 0)
+        similarity = fuzz.ratio(normalized1, normalized2, score_cutoff=threshold * 100)
+        return similarity >= threshold * 100
     
     def merge_location_attributes(self, entity, attributes, new_confidence=0):
         """
@@ -111,11 +142,11 @@ class GlobalEntityIntegrator:
         
         # Update if coordinates have higher precision (more decimal places)
         if all(k in attributes for k in ["latitude", "longitude"]) and all(k in entity for k in ["latitude", "longitude"]):
-            current_lat_precision = len(str(entity["latitude"]).split('.')[-1]) if '.' in str(entity["latitude"]) else 0
-            current_lon_precision = len(str(entity["longitude"]).split('.')[-1]) if '.' in str(entity["longitude"]) else 0
+            current_lat_precision = _decimal_places(entity["latitude"])
+            current_lon_precision = _decimal_places(entity["longitude"])
             
-            new_lat_precision = len(str(attributes["latitude"]).split('.')[-1]) if '.' in str(attributes["latitude"]) else 0
-            new_lon_precision = len(str(attributes["longitude"]).split('.')[-1]) if '.' in str(attributes["longitude"]) else 0
+            new_lat_precision = _decimal_places(attributes["latitude"])
+            new_lon_precision = _decimal_places(attributes["longitude"])
             
             if new_lat_precision > current_lat_precision or new_lon_precision > current_lon_precision:
                 # Update all coordinate-related attributes
@@ -194,6 +225,8 @@ class GlobalEntityIntegrator:
         
         # 2. Entity integration
         for entity in article_data.get("entities", []):
+            # Compute the comparison key once for all similarity checks (on a copy, the input isn't modified)
+            entity = {**entity, "_text_key": _text_key(entity)}
             local_id = entity["id"]
             entity_type = entity["type"]
             normalized_text = entity.get("normalized", entity["text"])
@@ -206,17 +239,20 @@ class GlobalEntityIntegrator:
                 attributes = time_map[local_id]
             
             # First check similarity with existing global entities
+            # (only entities of the same type can be similar, and an entity with the same text is tried first)
             matched_entity = None
-            for global_id, global_entity in self.global_entities.items():
+            candidates = self._by_type[entity_type]
+            exact_id = self._exact_index.get((entity_type, entity["_text_key"]))
+            if exact_id is not None:
+                candidates = chain((exact_id,), candidates)
+            for global_id in candidates:
+                global_entity = self.global_entities[global_id]
                 if self.are_entities_similar(entity, global_entity):
                     matched_entity = global_entity
                     self.id_mapping[(article_id, local_id)] = global_id
                     
-                    # Add source information
-                    if "sources" not in global_entity:
-                        global_entity["sources"] = []
-                    if article_id not in global_entity["sources"]:
-                        global_entity["sources"].append(article_id)
+                    # Add source information (kept once, in order of first appearance)
+                    global_entity.setdefault("sources", {})[article_id] = None
                     
                     # Update basic attributes if confidence is higher
                     if entity["confidence"] > global_entity["confidence"]:
@@ -224,6 +260,8 @@ class GlobalEntityIntegrator:
                         global_entity["confidence"] = entity["confidence"]
                         if "normalized" in entity:
                             global_entity["normalized"] = entity["normalized"]
+                        global_entity["_text_key"] = _text_key(global_entity)
+                        self._exact_index.setdefault((entity_type, global_entity["_text_key"]), global_id)
                     
                     # Smart merge of attribute information
                     if attributes:
@@ -246,11 +284,12 @@ class GlobalEntityIntegrator:
                     "type": entity_type,
                     "text": entity["text"],
                     "confidence": entity["confidence"],
-                    "sources": [article_id]
+                    "sources": {article_id: None}
                 }
                 
                 if "normalized" in entity:
                     new_entity["normalized"] = entity["normalized"]
+                new_entity["_text_key"] = _text_key(new_entity)
                 
                 # Integrate attribute data
                 if attributes:
@@ -263,6 +302,9 @@ class GlobalEntityIntegrator:
                             if key != "type":  # Don't overwrite the type field
                                 new_entity[key] = attributes[key]
                 
+                if global_id not in self.global_entities:
+                    self._by_type[entity_type].append(global_id)
+                self._exact_index.setdefault((entity_type, new_entity["_text_key"]), global_id)
                 self.global_entities[global_id] = new_entity
                 self.id_mapping[(article_id, local_id)] = global_id
                 
@@ -301,40 +343,22 @@ class GlobalEntityIntegrator:
                 signature += f"_loc_{context_location_global}"
             
             # Check for duplicate with existing relations
-            is_duplicate = False
-            for existing_relation in self.global_relations:
-                existing_sig = f"{existing_relation['subject']}_{existing_relation['predicate']}_{existing_relation['object']}"
-                if "context_time" in existing_relation:
-                    existing_sig += f"_time_{existing_relation['context_time']}"
-                if "context_location" in existing_relation:
-                    existing_sig += f"_loc_{existing_relation['context_location']}"
+            existing_relation = self._relation_by_sig.get(signature)
+            if existing_relation is not None:
+                # Update if confidence is higher
+                if relation["confidence"] > existing_relation["confidence"]:
+                    existing_relation["confidence"] = relation["confidence"]
                 
-                if signature == existing_sig:
-                    is_duplicate = True
-                    # Update if confidence is higher
-                    if relation["confidence"] > existing_relation["confidence"]:
-                        existing_relation["confidence"] = relation["confidence"]
-                    
-                    # Add source information
-                    if "sources" not in existing_relation:
-                        existing_relation["sources"] = []
-                    if article_id not in existing_relation["sources"]:
-                        existing_relation["sources"].append(article_id)
-                    
-                    if self.debug_mode:
-                        print(f"  Found duplicate relation: {relation['predicate']}")
-                    
-                    break
+                # Add source information (kept once, in order of first appearance)
+                existing_relation.setdefault("sources", {})[article_id] = None
+                
+                if self.debug_mode:
+                    print(f"  Found duplicate relation: {relation['predicate']}")
             
             # Add new relation if not a duplicate
-            if not is_duplicate:
-                # Generate relation hash ID
-                signature = f"{subject_global}_{relation['predicate']}_{object_global}"
-                if context_time_global:
-                    signature += f"_time_{context_time_global}"
-                if context_location_global:
-                    signature += f"_loc_{context_location_global}"
-                relation_id = "R" + hashlib.md5(signature.encode()).hexdigest()[:11]
+            else:
+                # Generate relation hash ID from the signature
+                relation_id = "R" + hashlib.blake2b(signature.encode(), digest_size=6).hexdigest()[:11]
                 
                 new_relation = {
                     "id": relation_id,
@@ -342,7 +366,7 @@ class GlobalEntityIntegrator:
                     "predicate": relation["predicate"],
                     "object": object_global,
                     "confidence": relation["confidence"],
-                    "sources": [article_id]
+                    "sources": {article_id: None}
                 }
                 
                 if context_time_global:
@@ -351,6 +375,7 @@ class GlobalEntityIntegrator:
                     new_relation["context_location"] = context_location_global
                 
                 self.global_relations.append(new_relation)
+                self._relation_by_sig[signature] = new_relation
                 relations_added += 1
         
         if self.debug_mode:
@@ -364,38 +389,41 @@ class GlobalEntityIntegrator:
             self.integrate_article(article_id, article_data)
         
         return {
-            "entities": list(self.global_entities.values()),
-            "relations": self.global_relations
+            "entities": self.get_entities(),
+            "relations": self.get_relations()
         }
     
+    def get_entities(self):
+        """
+        Get the global entities without internal fields
+        """
+        return [_public_record(entity) for entity in self.global_entities.values()]
+    
+    def get_relations(self):
+        """
+        Get the global relations without internal fields
+        """
+        return [_public_record(relation) for relation in self.global_relations]
+    
     def validate_entity_mappings(self):
         """
         Validate entity integration results and provide statistics
         """
-        # Statistics by entity type
-        entity_types = {}
-        location_with_coords = 0
-        location_without_coords = 0
-        time_with_dates = 0
-        time_without_dates = 0
-        
-        for entity in self.global_entities.values():
-            entity_type = entity["type"]
-            entity_types[entity_type] = entity_types.get(entity_type, 0) + 1
-            
-            # Validate location entity attributes
-            if entity_type == "LOCATION":
-                if "latitude" in entity and "longitude" in entity and entity["latitude"] and entity["longitude"]:
-                    location_with_coords += 1
-                else:
-                    location_without_coords += 1
-            
-            # Validate time entity attributes
-            elif entity_type == "TIME":
-                if "start_date" in entity and entity["start_date"]:
-                    time_with_dates += 1
-                else:
-                    time_without_dates += 1
+        # Statistics by entity type (from the per-type ID lists, in order of first appearance)
+        entity_types = {entity_type: len(ids) for entity_type, ids in self._by_type.items() if ids}
+        
+        # Validate location entity attributes
+        location_with_coords = sum(
+            1 for global_id in self._by_type.get("LOCATION", [])
+            if self.global_entities[global_id].get("latitude") and self.global_entities[global_id].get("longitude")
+        )
+        location_without_coords = entity_types.get("LOCATION", 0) - location_with_coords
+        
+        # Validate time entity attributes
+        time_with_dates = sum(
+            1 for global_id in self._by_type.get("TIME", []) if self.global_entities[global_id].get("start_date")
+        )
+        time_without_dates = entity_types.get("TIME", 0) - time_with_dates
         
         # Relation statistics
         relations_with_time = sum(1 for r in self.global_relations if "context_time" in r and r["context_time"])
@@ -442,12 +470,12 @@ class GlobalEntityIntegrator:
         Save integrated data to a JSON file
         """
         output_data = {
-            "entities": list(self.global_entities.values()),
-            "relations": self.global_relations
+            "entities": self.get_entities(),
+            "relations": self.get_relations()
         }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
             
         print(f"Integrated data saved to {output_file}")
     
@@ -457,17 +485,27 @@ class GlobalEntityIntegrator:
         """
         os.makedirs(output_dir, exist_ok=True)
         
-        # 1. Entity basic information CSV - using proper CSV library
-        with open(f"{output_dir}/entities.csv", 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-            # Header
-            writer.writerow(["entity_id", "type", "text", "normalized", "confidence", "sources"])
+        # 1-3. Entity basic information, location and time attribute CSVs, written in a single pass over the entities
+        with ExitStack() as stack:
+            entity_writer, location_writer, time_writer = (
+                csv.writer(stack.enter_context(open(f"{output_dir}/{name}", 'w', encoding='utf-8', newline='')),
+                           quoting=csv.QUOTE_MINIMAL)
+                for name in ("entities.csv", "locations.csv", "timeperiods.csv")
+            )
             
-            # Data
+            # Headers
+            entity_writer.writerow(["entity_id", "type", "text", "normalized", "confidence", "sources"])
+            location_writer.writerow(["entity_id", "latitude", "longitude", "display_name", "location_type", 
+                                      "importance", "bbox_south", "bbox_north", "bbox_west", "bbox_east"])
+            time_writer.writerow(["entity_id", "precision", "type", "start_date", "end_date", "date_reliability"])
+            
+            location_count = 0
+            time_count = 0
             for entity in self.global_entities.values():
+                # Entity basic information
                 sources = "|".join(entity.get("sources", []))
                 normalized = entity.get("normalized", "")
-                writer.writerow([
+                entity_writer.writerow([
                     entity['id'], 
                     entity['type'], 
                     entity['text'], 
@@ -475,17 +513,8 @@ class GlobalEntityIntegrator:
                     entity['confidence'], 
                     sources
                 ])
-        
-        # 2. Location entity attributes CSV
-        with open(f"{output_dir}/locations.csv", 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-            # Header
-            writer.writerow(["entity_id", "latitude", "longitude", "display_name", "location_type", 
-                           "importance", "bbox_south", "bbox_north", "bbox_west", "bbox_east"])
-            
-            # Data - process all LOCATION entities
-            location_count = 0
-            for entity in self.global_entities.values():
+                
+                # Location entity attributes
                 if entity["type"] == "LOCATION":
                     # Set default values
                     row = [
@@ -500,21 +529,11 @@ class GlobalEntityIntegrator:
                         entity.get("bbox_west", ""),
                         entity.get("bbox_east", "")
                     ]
-                    writer.writerow(row)
+                    location_writer.writerow(row)
                     location_count += 1
-            
-            print(f"Wrote {location_count} location entities to locations.csv")
-        
-        # 3. Time entity attributes CSV
-        with open(f"{output_dir}/timeperiods.csv", 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-            # Header
-            writer.writerow(["entity_id", "precision", "type", "start_date", "end_date", "date_reliability"])
-
-            # Data - process all TIME entities
-            time_count = 0
-            for entity in self.global_entities.values():
-                if entity["type"] == "TIME":
+                
+                # Time entity attributes
+                elif entity["type"] == "TIME":
                     row = [
                         entity['id'],
                         entity.get("precision", "UNKNOWN"),
@@ -523,10 +542,11 @@ class GlobalEntityIntegrator:
                         entity.get("end_date", entity.get("start_date", "")),
                         entity.get("date_reliability", "")
                     ]
-                    writer.writerow(row)
+                    time_writer.writerow(row)
                     time_count += 1
-
-            print(f"Wrote {time_count} time entities to timeperiods.csv")
+        
+        print(f"Wrote {location_count} location entities to locations.csv")
+        print(f"Wrote {time_count} time entities to timeperiods.csv")
         
         # 4. Relations CSV
         with open(f"{output_dir}/relations.csv", 'w', encoding='utf-8', newline='') as f:
@@ -578,8 +598,8 @@ def main():
     for i, json_file in enumerate(json_files):
         print(f"[{i+1}/{len(json_files)}] Integrating {json_file}...")
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(json_file, 'rb') as f:
+                data = orjson.loads(f.read())
                 
                 # Track number of articles processed in this file
                 file_articles = 0
@@ -604,15 +624,8 @@ def main():
             print(f"Error processing file {json_file}: {e}")
             print("Continuing with next file...")
     
-    # Generate and save integrated results
-    integrated_data = {
-        "entities": list(integrator.global_entities.values()),
-        "relations": integrator.global_relations
-    }
-    
-    # Save to JSON in the integrated_results directory
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(integrated_data, f, ensure_ascii=False, indent=2)
+    # Save integrated results to JSON in the integrated_results directory
+    integrator.write_to_json(output_json)
     
     # Validate integration results
     validation_results = integrator.validate_entity_mappings()
@@ -1,5 +1,11 @@
 # qa_system_cli.py
 import os
+import re
+import sys
+import json
+import time
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Any
 
 from langchain.prompts import ChatPromptTemplate
@@ -7,8 +13,8 @@ from langchain_openai import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
 from langchain_neo4j import Neo4jGraph  
 from langchain.chains.structured_output import create_structured_output_runnable
-from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema import StrOutputParser
+from openai import OpenAI
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
@@ -21,6 +27,146 @@ NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Retries of the OpenAI client on rate limits, timeouts and 5xx errors (with backoff)
+OPENAI_MAX_RETRIES = 5
+
+# Output token caps of the Cypher generation call (query + explanation) and the final answer
+CYPHER_MAX_TOKENS = 400
+RESPONSE_MAX_TOKENS = 800
+
+# Seconds between status checks while a Batch API job is running
+BATCH_POLL_INTERVAL = 60
+
+# Cypher queries of a bulk run executed at the same time (each in its own Neo4j session)
+BULK_QUERY_WORKERS = 8
+
+# Rows and characters per value of the query results passed to the response LLM
+MAX_RESULT_ROWS = 50
+MAX_VALUE_LENGTH = 500
+
+LIMIT_PATTERN = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+RETURN_PATTERN = re.compile(r"\bRETURN\b", re.IGNORECASE)
+
+def with_result_limit(query: str) -> str:
+    """Append LIMIT MAX_RESULT_ROWS to a generated query that returns rows without any LIMIT"""
+    if LIMIT_PATTERN.search(query) or not RETURN_PATTERN.search(query):
+        return query
+    return f"{query.rstrip().rstrip(';')}\nLIMIT {MAX_RESULT_ROWS}"
+
+# Questions naming only years outside World War I are answered without querying the LLM or the graph
+# A number counts as a year only in a date context ("in 1870", "April 1915", "the 1870s"), not in "2000 prisoners"
+_YEAR = r"(1[89][0-9]{2}|20[0-9]{2})"
+_MONTH = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|Sept?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+YEAR_PATTERN = re.compile(
+    rf"\b(?:in|during|since|before|after|until|year)\s+(?:the\s+)?{_YEAR}\b"
+    rf"|\b{_MONTH}\.?\s+(?:[0-9]{{1,2}}(?:st|nd|rd|th)?,?\s+)?{_YEAR}\b"
+    rf"|\b{_YEAR}s\b",
+    re.IGNORECASE
+)
+OUT_OF_SCOPE_RESPONSE = ("This knowledge graph covers World War I events, primarily from April 1915, "
+                         "so it has no information about the period you asked about.")
+
+def in_scope(question: str) -> bool:
+    """False if the question mentions years or decades and none of them overlaps 1914-1918"""
+    # findall returns one group per date context; only the matching one is non-empty
+    periods = []
+    for year, month_year, decade in YEAR_PATTERN.findall(question):
+        start = int(year or month_year or decade)
+        # "the 1910s" covers 1910-1919
+        periods.append((start, start + 9 if decade else start))
+    return not periods or any(start <= 1918 and end >= 1914 for start, end in periods)
+
+# Node properties, relationship properties and entity counts in one round-trip
+SCHEMA_QUERY = """
+CALL {
+    CALL apoc.meta.nodeTypeProperties()
+    YIELD nodeType, propertyName, propertyTypes
+    WITH nodeType, collect({property: propertyName, types: propertyTypes}) AS properties
+    RETURN collect({nodeType: nodeType, properties: properties}) AS node_properties
+}
+CALL {
+    CALL apoc.meta.relTypeProperties()
+    YIELD relType, propertyName, propertyTypes
+    WITH relType, collect({property: propertyName, types: propertyTypes}) AS properties
+    RETURN collect({relType: relType, properties: properties}) AS rel_properties
+}
+CALL {
+    MATCH (e:Entity)
+    WITH e.type AS entityType, count(*) AS count
+    ORDER BY count DESC
+    RETURN collect({entityType: entityType, count: count}) AS entity_stats
+}
+RETURN node_properties, rel_properties, entity_stats
+"""
+
+# Pydantic model for Cypher query generation
+class CypherQueryOutput(BaseModel):
+    query: str = Field(description="Cypher query to execute in Neo4j")
+    explanation: str = Field(description="Explanation of how this query answers the natural language question")
+
+# Structured output format of CypherQueryOutput for raw Batch API requests
+CYPHER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "cypher_query",
+        "strict": True,
+        "schema": {**CypherQueryOutput.model_json_schema(), "additionalProperties": False}
+    }
+}
+
+# Query generation prompt template
+QUERY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert system that answers natural language questions using a Neo4j knowledge graph about historical events from World War I.
+You need to understand the graph schema provided below and convert natural language questions into effective Cypher queries.
+
+{schema}
+
+Follow these rules:
+1. Generate a single, accurate Cypher query.
+2. The query results should directly answer the natural language question.
+3. Note: This graph only contains information about World War I events, primarily from April 1915.
+4. For time-related questions, use TIME entities and HAS_TEMPORAL_CONTEXT relationships.
+5. For location-related questions, use LOCATION entities and HAS_SPATIAL_CONTEXT relationships.
+6. Remember that people or armies (PERSON) are often represented as groups like "French troops" or "German troops".
+7. All subject-predicate-object relationships are connected through intermediate Assertion nodes, not direct edges.
+8. Use SUBJECT_OF and OBJECT_IS relationships to express subject-object relationships.
+9. Use toLower() function for case-insensitive string comparisons.
+10. Use LIMIT to restrict the number of results (e.g., LIMIT 10).
+
+Now generate the optimal Cypher query for the natural language question and explain it."""),
+    ("human", "Question: {question}")
+])
+
+# Answer generation prompt template
+RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a knowledge graph-based question answering system for World War I history.
+You need to answer natural language questions based on the provided query results.
+
+Follow these rules when crafting your response:
+1. This knowledge graph contains historical events from World War I, primarily from April 1915.
+2. Provide accurate and complete answers based on the query results, considering historical context.
+3. Include relevant entity, time, and location information when available to enrich your answer.
+4. When explaining historical events, clearly articulate temporal sequence and causal relationships.
+5. If no results are found, politely explain that the information may not be included in the current knowledge graph.
+6. Present historical facts objectively and neutrally.
+
+Analyze the structure and content of the query results thoroughly, and provide a natural, expert-like response considering the context of the user's question."""),
+    ("human", """Question: {question}
+
+Below are the query and results from the knowledge graph:
+
+Query:
+{query}
+
+Query explanation:
+{explanation}
+
+Results:
+{results}
+
+Please provide an answer to the question based on this information.""")
+])
+
 class HistoricalKnowledgeGraphQA:
     def __init__(self):
         """Initialize the knowledge graph QA system using Neo4j and OpenAI"""
@@ -34,11 +180,20 @@ class HistoricalKnowledgeGraphQA:
         # Get graph schema information
         self.graph_schema = self.get_graph_schema()
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
+        # Initialize LLMs: a short structured output for the Cypher query, a longer answer for the response
+        self.cypher_llm = ChatOpenAI(
+            model="gpt-4o-mini",
+            temperature=0,
+            api_key=OPENAI_API_KEY,
+            max_retries=OPENAI_MAX_RETRIES,
+            max_tokens=CYPHER_MAX_TOKENS
+        )
+        self.response_llm = ChatOpenAI(
             model="gpt-4o-mini",
             temperature=0,
-            api_key=OPENAI_API_KEY
+            api_key=OPENAI_API_KEY,
+            max_retries=OPENAI_MAX_RETRIES,
+            max_tokens=RESPONSE_MAX_TOKENS
         )
         
         # Initialize query transformation chain
@@ -50,38 +205,22 @@ class HistoricalKnowledgeGraphQA:
     def get_graph_schema(self) -> str:
         """Retrieve and format the schema information from the Neo4j graph"""
         try:
-            # Get node labels and property information
-            node_properties = self.graph.query("""
-            CALL apoc.meta.nodeTypeProperties()
-            YIELD nodeType, propertyName, propertyTypes
-            RETURN nodeType, collect({property: propertyName, types: propertyTypes}) as properties
-            """)
-            
-            # Get relationship types and property information
-            rel_properties = self.graph.query("""
-            CALL apoc.meta.relTypeProperties()
-            YIELD relType, propertyName, propertyTypes
-            RETURN relType, collect({property: propertyName, types: propertyTypes}) as properties
-            """)
-            
-            # Get entity type statistics
-            entity_stats = self.graph.query("""
-            MATCH (e:Entity)
-            RETURN e.type AS entityType, count(*) AS count
-            ORDER BY count DESC
-            """)
+            schema_data = self.graph.query(SCHEMA_QUERY)[0]
+            node_properties = schema_data['node_properties']
+            rel_properties = schema_data['rel_properties']
+            entity_stats = schema_data['entity_stats']
             
             # Construct schema string
-            schema = "# Knowledge Graph Schema Information\n\n"
+            schema_parts = ["# Knowledge Graph Schema Information\n\n"]
             
-            schema += "## Entity Type Statistics\n"
+            schema_parts.append("## Entity Type Statistics\n")
             for stat in entity_stats:
-                schema += f"- {stat['entityType']}: {stat['count']} entities\n"
-            schema += "\n"
+                schema_parts.append(f"- {stat['entityType']}: {stat['count']} entities\n")
+            schema_parts.append("\n")
             
-            schema += "## Node Types and Properties\n"
+            schema_parts.append("## Node Types and Properties\n")
             for node in node_properties:
-                schema += f"### {node['nodeType']}\n"
+                schema_parts.append(f"### {node['nodeType']}\n")
                 for prop in node['properties']:
                     # Handle the 'types' field safely
                     types_str = ""
@@ -92,12 +231,12 @@ class HistoricalKnowledgeGraphQA:
                     else:
                         types_str = str(prop['types'])
                     
-                    schema += f"- {prop['property']}: {types_str}\n"
-                schema += "\n"
+                    schema_parts.append(f"- {prop['property']}: {types_str}\n")
+                schema_parts.append("\n")
             
-            schema += "## Relationship Types and Properties\n"
+            schema_parts.append("## Relationship Types and Properties\n")
             for rel in rel_properties:
-                schema += f"### {rel['relType']}\n"
+                schema_parts.append(f"### {rel['relType']}\n")
                 for prop in rel['properties']:
                     # Handle the 'types' field safely
                     types_str = ""
@@ -108,17 +247,16 @@ class HistoricalKnowledgeGraphQA:
                     else:
                         types_str = str(prop['types'])
                     
-                    schema += f"- {prop['property']}: {types_str}\n"
-                schema += "\n"
+                    schema_parts.append(f"- {prop['property']}: {types_str}\n")
+                schema_parts.append("\n")
             
         except Exception as e:
             print(f"Error generating schema: {e}")
             # Return a simplified schema if we can't get the full details
-            schema = "# Knowledge Graph Schema Information\n\n"
-            schema += "Note: Could not retrieve detailed schema information.\n\n"
+            schema_parts = ["# Knowledge Graph Schema Information\n\n", "Note: Could not retrieve detailed schema information.\n\n"]
         
         # Add knowledge graph structure explanation
-        schema += """
+        schema_parts.append("""
 ## Knowledge Graph Structure Explanation
 This knowledge graph contains historical events from World War I, particularly focused on events in April 1915.
 
@@ -169,111 +307,55 @@ Query Examples:
    MATCH (subject:Entity:PERSON {text: "French troops"})-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
    RETURN subject.text, assertion.predicate, object.text
    ```
-"""
+""")
         
-        return schema
+        return "".join(schema_parts)
     
     def setup_query_chain(self):
         """Set up the chain for converting natural language questions to Cypher queries"""
-        # Pydantic model for Cypher query generation
-        class CypherQueryOutput(BaseModel):
-            query: str = Field(description="Cypher query to execute in Neo4j")
-            explanation: str = Field(description="Explanation of how this query answers the natural language question")
-        
-        # Query generation prompt template
-        query_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert system that answers natural language questions using a Neo4j knowledge graph about historical events from World War I.
-You need to understand the graph schema provided below and convert natural language questions into effective Cypher queries.
-
-{schema}
-
-Follow these rules:
-1. Generate a single, accurate Cypher query.
-2. The query results should directly answer the natural language question.
-3. Note: This graph only contains information about World War I events, primarily from April 1915.
-4. For time-related questions, use TIME entities and HAS_TEMPORAL_CONTEXT relationships.
-5. For location-related questions, use LOCATION entities and HAS_SPATIAL_CONTEXT relationships.
-6. Remember that people or armies (PERSON) are often represented as groups like "French troops" or "German troops".
-7. All subject-predicate-object relationships are connected through intermediate Assertion nodes, not direct edges.
-8. Use SUBJECT_OF and OBJECT_IS relationships to express subject-object relationships.
-9. Use toLower() function for case-insensitive string comparisons.
-10. Use LIMIT to restrict the number of results (e.g., LIMIT 10).
-
-Now generate the optimal Cypher query for the natural language question and explain it."""),
-            ("human", "Question: {question}")
-        ])
-        
         # Use the newer with_structured_output method instead of create_structured_output_runnable
-        structured_llm = self.llm.with_structured_output(CypherQueryOutput)
+        structured_llm = self.cypher_llm.with_structured_output(CypherQueryOutput)
         
-        # Create a simple chain that combines the prompt with the structured output model
-        self.query_chain = RunnablePassthrough.assign(
-            query_output=lambda x: structured_llm.invoke(query_prompt.format(schema=x["schema"], question=x["question"]))
-        )
+        # The schema never changes after startup, so bind it once; only the question varies per call
+        self.query_chain = QUERY_PROMPT.partial(schema=self.graph_schema) | structured_llm
     
     def setup_response_chain(self):
         """Set up the chain for generating the final response using query results"""
-        response_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a knowledge graph-based question answering system for World War I history.
-You need to answer natural language questions based on the provided query results.
-
-Follow these rules when crafting your response:
-1. This knowledge graph contains historical events from World War I, primarily from April 1915.
-2. Provide accurate and complete answers based on the query results, considering historical context.
-3. Include relevant entity, time, and location information when available to enrich your answer.
-4. When explaining historical events, clearly articulate temporal sequence and causal relationships.
-5. If no results are found, politely explain that the information may not be included in the current knowledge graph.
-6. Present historical facts objectively and neutrally.
-
-Analyze the structure and content of the query results thoroughly, and provide a natural, expert-like response considering the context of the user's question."""),
-            ("human", """Question: {question}
-
-Below are the query and results from the knowledge graph:
-
-Query:
-{query}
-
-Query explanation:
-{explanation}
-
-Results:
-{results}
-
-Please provide an answer to the question based on this information.""")
-        ])
-        
         # Set up response generation chain
-        self.response_chain = response_prompt | self.llm | StrOutputParser()
+        self.response_chain = RESPONSE_PROMPT | self.response_llm | StrOutputParser()
     
     def format_results(self, results: List[Dict[str, Any]]) -> str:
         """Format query results into a readable format"""
         if not results:
             return "No results found."
         
-        formatted = ""
-        for i, result in enumerate(results, 1):
-            formatted += f"Result {i}:\n"
+        # Collect the pieces and join once; the LLM gets at most MAX_RESULT_ROWS rows of bounded values
+        formatted = []
+        for i, result in enumerate(results[:MAX_RESULT_ROWS], 1):
+            formatted.append(f"Result {i}:\n")
             for key, value in result.items():
                 if isinstance(value, (dict, list)):
-                    formatted += f"  {key}: {str(value)}\n"
+                    # orjson is much faster than str() on nested values; str() covers Neo4j date/time types
+                    value = orjson.dumps(value, default=str).decode()
                 else:
-                    formatted += f"  {key}: {value}\n"
-            formatted += "\n"
+                    value = str(value)
+                formatted.append(f"  {key}: {value[:MAX_VALUE_LENGTH]}\n")
+            formatted.append("\n")
         
-        return formatted
+        if len(results) > MAX_RESULT_ROWS:
+            formatted.append(f"... {len(results) - MAX_RESULT_ROWS} more results truncated\n")
+        
+        return "".join(formatted)
     
     def process_query(self, question: str) -> str:
         """Process a natural language question and generate a response"""
+        if not in_scope(question):
+            return OUT_OF_SCOPE_RESPONSE
+        
         try:
             # 1. Convert natural language question to Cypher query
-            query_result = self.query_chain.invoke({
-                "schema": self.graph_schema,
-                "question": question
-            })
-            
-            # Access the structured output
-            query_output = query_result["query_output"]
-            cypher_query = query_output.query
+            query_output = self.query_chain.invoke({"question": question})
+            cypher_query = with_result_limit(query_output.query)
             query_explanation = query_output.explanation
             
             # 2. Execute Cypher query
@@ -292,12 +374,132 @@ Please provide an answer to the question based on this information.""")
         
         except Exception as e:
             return f"An error occurred while processing your question: {str(e)}"
+    
+    def batch_request(self, custom_id: str, messages, llm: ChatOpenAI) -> Dict:
+        """Build a Batch API chat completion request from LangChain prompt messages, with the settings of `llm`"""
+        roles = {"system": "system", "human": "user", "ai": "assistant"}
+        body = {
+            "model": llm.model_name,
+            "messages": [{"role": roles[message.type], "content": message.content} for message in messages],
+            "temperature": llm.temperature,
+            "max_tokens": llm.max_tokens
+        }
+        return {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+    
+    def run_batch_job(self, batch_requests: List[Dict]) -> Dict[str, str]:
+        """
+        Submit chat completion requests as one OpenAI Batch API job and wait for it to finish.
+        Returns the response text of every successful request, keyed by its custom_id.
+        """
+        client = OpenAI(api_key=OPENAI_API_KEY)
+        
+        # Upload the requests as a JSONL file
+        batch_input = "\n".join(json.dumps(request, ensure_ascii=False) for request in batch_requests)
+        input_file = client.files.create(file=("batch_requests.jsonl", batch_input.encode("utf-8")), purpose="batch")
+        
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"  Submitted batch {batch.id} with {len(batch_requests)} requests")
+        
+        # Poll until the batch reaches a final state
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(BATCH_POLL_INTERVAL)
+            batch = client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            if counts:
+                print(f"  Batch status: {batch.status} ({counts.completed}/{counts.total} completed)")
+        
+        if batch.status != "completed":
+            print(f"  Batch {batch.id} ended with status: {batch.status}")
+        
+        # Collect the response texts (expired batches may still have partial output)
+        responses = {}
+        if batch.output_file_id:
+            output_text = client.files.content(batch.output_file_id).text
+            for line in output_text.splitlines():
+                if not line.strip():
+                    continue
+                output = json.loads(line)
+                response = output.get("response") or {}
+                if response.get("status_code") == 200:
+                    responses[output["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    print(f"  Request {output['custom_id']} failed: {output.get('error') or response.get('body')}")
+        
+        return responses
+    
+    def process_bulk(self, questions: List[str]) -> List[str]:
+        """
+        Answer many questions with two OpenAI Batch API jobs (half the cost of live requests and no
+        per-request rate limiting): one generates all Cypher queries, the other all final responses.
+        Batch jobs can take up to 24 hours, so this is meant for offline evaluation runs.
+        """
+        answers = [None if in_scope(question) else OUT_OF_SCOPE_RESPONSE for question in questions]
+        query_prompt = QUERY_PROMPT.partial(schema=self.graph_schema)
+        
+        # 1. Convert all in-scope questions to Cypher queries in one batch
+        batch_requests = []
+        for i, question in enumerate(questions):
+            if answers[i] is not None:
+                continue
+            request = self.batch_request(f"cypher_{i}", query_prompt.format_messages(question=question), self.cypher_llm)
+            request["body"]["response_format"] = CYPHER_RESPONSE_FORMAT
+            batch_requests.append(request)
+        print(f"Generating Cypher queries for {len(batch_requests)} questions")
+        cypher_texts = self.run_batch_job(batch_requests) if batch_requests else {}
+        
+        # 2. Execute the Cypher queries concurrently and prepare the response requests
+        def answer_request(i: int) -> Optional[Dict[str, Any]]:
+            # Errors are recorded per question, so one failing query does not stop the others
+            try:
+                if f"cypher_{i}" not in cypher_texts:
+                    raise ValueError("No batch response for the Cypher query")
+                query_output = CypherQueryOutput.model_validate_json(cypher_texts[f"cypher_{i}"])
+                cypher_query = with_result_limit(query_output.query)
+                results = self.graph.query(cypher_query)
+                messages = RESPONSE_PROMPT.format_messages(
+                    question=questions[i],
+                    query=cypher_query,
+                    explanation=query_output.explanation,
+                    results=self.format_results(results)
+                )
+                return self.batch_request(f"answer_{i}", messages, self.response_llm)
+            except Exception as e:
+                answers[i] = f"An error occurred while processing your question: {str(e)}"
+                return None
+        
+        pending = [i for i in range(len(questions)) if answers[i] is None]
+        with ThreadPoolExecutor(max_workers=BULK_QUERY_WORKERS) as executor:
+            batch_requests = [request for request in executor.map(answer_request, pending) if request is not None]
+        
+        # 3. Generate the final responses in a second batch
+        print(f"Generating responses for {len(batch_requests)} questions")
+        answer_texts = self.run_batch_job(batch_requests) if batch_requests else {}
+        for i in range(len(questions)):
+            if answers[i] is None:
+                answers[i] = answer_texts.get(f"answer_{i}", "An error occurred while processing your question: No batch response")
+        
+        return answers
 
 # Usage example
 def main():
     """Main function to interact with the QA system"""
     qa_system = HistoricalKnowledgeGraphQA()
     
+    # Bulk mode: python qa_system_cli.py questions.txt (one question per line)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        
+        for question, answer in zip(questions, qa_system.process_bulk(questions)):
+            print(f"\nQuestion: {question}")
+            print("Answer:")
+            print(answer)
+        return
+    
     while True:
         question = input("\nEnter your question (type 'exit' to quit): ")
         if question.lower() == 'exit':
@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+# The web app and the CLI each keep a copy of the scope check; both are tested with the same cases
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "web")]
+
+import qa_system_cli
+from app import qa_system
+
+IN_SCOPE = [
+    "What happened to the 2000 prisoners?",
+    "Were there 1850 casualties at the Somme?",
+    "Who received 1900 rifles?",
+    "What happened in April 1915?",
+    "What events took place on April 4, 1915?",
+    "Which cities were bombed in 1915?",
+    "What happened in the 1910s?",
+    "Who was in Vienna?",
+]
+
+OUT_OF_SCOPE = [
+    "What happened in 1870?",
+    "Which battles were fought during the 1860s?",
+    "What happened in May 1870?",
+    "Who governed Vienna after 2000?",
+]
+
+class InScopeTest(unittest.TestCase):
+    def test_in_scope(self):
+        for module in (qa_system, qa_system_cli):
+            for question in IN_SCOPE:
+                with self.subTest(module=module.__name__, question=question):
+                    self.assertTrue(module.in_scope(question))
+    
+    def test_out_of_scope(self):
+        for module in (qa_system, qa_system_cli):
+            for question in OUT_OF_SCOPE:
+                with self.subTest(module=module.__name__, question=question):
+                    self.assertFalse(module.in_scope(question))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,10 +11,18 @@ class Settings(BaseSettings):
     neo4j_uri: str
     neo4j_username: str
     neo4j_password: str
+    neo4j_max_connection_pool_size: int = 100  # Bolt connections shared by all requests
+    neo4j_connection_acquisition_timeout: float = 30.0  # Seconds to wait for a free connection
     
     # OpenAI settings
     openai_api_key: str
     openai_model: str = "gpt-4o-mini"  # Default value
+    openai_max_retries: int = 5  # Retries on rate limits, timeouts and 5xx errors (with backoff)
+    cypher_max_tokens: int = 400  # Output cap of the Cypher generation call (query + explanation)
+    response_max_tokens: int = 800  # Output cap of the final HTML answer
+    max_concurrent_queries: int = 4  # Questions processed at once by /api/query_batch
+    query_cache_size: int = 1024  # Generated Cypher queries (and their results) kept for repeated questions
+    query_result_ttl: int = 3600  # Seconds a cached query result stays valid (picks up graph re-imports)
     
     # App settings
     app_name: str = "Knowledge Graph QA System"
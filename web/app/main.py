@@ -1,5 +1,9 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -11,15 +15,32 @@ from app.config import Settings
 # Load settings
 settings = Settings()
 
+# QA system (created at startup, so each worker process gets its own Neo4j pool)
+qa_system: Optional[HistoricalKnowledgeGraphQA] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global qa_system
+    
+    # Connect to Neo4j and load the graph schema before serving requests
+    qa_system = HistoricalKnowledgeGraphQA()
+    await qa_system.initialize()
+    yield
+    await qa_system.close()
+
 # Initialize FastAPI application
-app = FastAPI(title="Knowledge Graph QA System")
+# JSON responses are serialized with orjson
+app = FastAPI(title="Knowledge Graph QA System", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Compress HTML, JSON and static responses over 512 bytes (Starlette leaves server-sent events uncompressed)
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
 # Configure static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Initialize QA system (loaded only once at app startup)
-qa_system = HistoricalKnowledgeGraphQA()
+# Limits how many batch questions hit OpenAI at the same time
+query_semaphore = asyncio.Semaphore(settings.max_concurrent_queries)
 
 # Request/Response models
 class QueryRequest(BaseModel):
@@ -28,25 +49,64 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     answer: str
 
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+
+class BatchQueryResponse(BaseModel):
+    answers: List[str]
+
+# Health check - Verifies the Neo4j connection (for the hosting platform's periodic checks)
+@app.get("/health")
+async def health():
+    try:
+        await qa_system.driver.verify_connectivity()
+        return {"status": "ok"}
+    except Exception as e:
+        return ORJSONResponse({"status": "error", "detail": str(e)}, status_code=503)
+
 # Root path - Display web interface
 @app.get("/", response_class=HTMLResponse)
 async def get_home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 # API endpoint - Process questions
-@app.post("/api/query", response_model=QueryResponse)
+# (returns the response directly: the models only document the schema, so FastAPI skips re-validating the output)
+@app.post("/api/query", responses={200: {"model": QueryResponse}})
 async def process_query(query_req: QueryRequest):
     try:
-        answer = qa_system.process_query(query_req.question)
-        return QueryResponse(answer=answer)
+        answer = await qa_system.process_query(query_req.question)
+        return ORJSONResponse({"answer": answer})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+# API endpoint - Stream the answer as server-sent events while it is generated
+@app.post("/api/query_stream")
+async def process_query_stream(query_req: QueryRequest):
+    async def events():
+        async for chunk in qa_system.process_query_stream(query_req.question):
+            # One event per chunk; line breaks inside a chunk become extra data lines
+            yield "".join(f"data: {line}\n" for line in chunk.split("\n")) + "\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# API endpoint - Process several questions concurrently
+@app.post("/api/query_batch", responses={200: {"model": BatchQueryResponse}})
+async def process_query_batch(batch_req: BatchQueryRequest):
+    async def answer(question: str) -> str:
+        async with query_semaphore:
+            return await qa_system.process_query(question)
+    
+    try:
+        answers = await asyncio.gather(*(answer(question) for question in batch_req.questions))
+        return ORJSONResponse({"answers": answers})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing queries: {str(e)}")
     
 # Form submission handler (for direct HTML form submissions)
 @app.post("/submit-query", response_class=HTMLResponse)
 async def submit_query(request: Request, question: str = Form(...)):
     try:
-        answer = qa_system.process_query(question)
+        answer = await qa_system.process_query(question)
         return templates.TemplateResponse(
             "index.html", 
             {"request": request, "question": question, "answer": answer}
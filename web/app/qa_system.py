@@ -1,186 +1,165 @@
-from typing import Dict, List, Optional, Any
+import asyncio
+import re
+import time
+import orjson
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Any
 
 # LangChain 0.3.23 imports
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
-from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncGraphDatabase
 from langchain.chains.structured_output import create_structured_output_runnable
-from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema import StrOutputParser
 from pydantic import BaseModel, Field
 
 from app.config import Settings
 
-class HistoricalKnowledgeGraphQA:
-    def __init__(self):
-        """Initialize the knowledge graph QA system using Neo4j and OpenAI"""
-        # Load settings
-        settings = Settings()
-        
-        # Create Neo4j graph object
-        self.graph = Neo4jGraph(
-            url=settings.neo4j_uri,
-            username=settings.neo4j_username,
-            password=settings.neo4j_password
-        )
-        
-        # Get graph schema information
-        self.graph_schema = self.get_graph_schema()
-        
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=settings.openai_model,
-            temperature=0,
-            api_key=settings.openai_api_key
-        )
-        
-        # Initialize query transformation chain
-        self.setup_query_chain()
-        
-        # Initialize response generation chain
-        self.setup_response_chain()
+class _LRU(OrderedDict):
+    """
+    Dictionary that keeps at most `cap` entries, evicting the least recently used one.
+    """
     
-    def get_graph_schema(self) -> str:
-        """Retrieve and format the schema information from the Neo4j graph"""
+    def __init__(self, cap: int):
+        super().__init__()
+        self.cap = cap
+    
+    def get(self, key, default=None):
+        # move_to_end raises KeyError for a missing key, so a hit takes a single lookup before the read
         try:
-            # Get node labels and property information
-            node_properties = self.graph.query("""
-            CALL apoc.meta.nodeTypeProperties()
-            YIELD nodeType, propertyName, propertyTypes
-            RETURN nodeType, collect({property: propertyName, types: propertyTypes}) as properties
-            """)
-            
-            # Get relationship types and property information
-            rel_properties = self.graph.query("""
-            CALL apoc.meta.relTypeProperties()
-            YIELD relType, propertyName, propertyTypes
-            RETURN relType, collect({property: propertyName, types: propertyTypes}) as properties
-            """)
-            
-            # Get entity type statistics
-            entity_stats = self.graph.query("""
-            MATCH (e:Entity)
-            RETURN e.type AS entityType, count(*) AS count
-            ORDER BY count DESC
-            """)
-            
-            # Construct schema string
-            schema = "# Knowledge Graph Schema Information\n\n"
-            
-            schema += "## Entity Type Statistics\n"
-            for stat in entity_stats:
-                schema += f"- {stat['entityType']}: {stat['count']} entities\n"
-            schema += "\n"
-            
-            schema += "## Node Types and Properties\n"
-            for node in node_properties:
-                schema += f"### {node['nodeType']}\n"
-                for prop in node['properties']:
-                    # Handle the 'types' field safely
-                    types_str = ""
-                    if isinstance(prop['types'], list):
-                        types_str = ', '.join(prop['types'])
-                    elif isinstance(prop['types'], str):
-                        types_str = prop['types']
-                    else:
-                        types_str = str(prop['types'])
-                    
-                    schema += f"- {prop['property']}: {types_str}\n"
-                schema += "\n"
-            
-            schema += "## Relationship Types and Properties\n"
-            for rel in rel_properties:
-                schema += f"### {rel['relType']}\n"
-                for prop in rel['properties']:
-                    # Handle the 'types' field safely
-                    types_str = ""
-                    if isinstance(prop['types'], list):
-                        types_str = ', '.join(prop['types'])
-                    elif isinstance(prop['types'], str):
-                        types_str = prop['types']
-                    else:
-                        types_str = str(prop['types'])
-                    
-                    schema += f"- {prop['property']}: {types_str}\n"
-                schema += "\n"
-            
-        except Exception as e:
-            print(f"Error generating schema: {e}")
-            # Return a simplified schema if we can't get the full details
-            schema = "# Knowledge Graph Schema Information\n\n"
-            schema += "Note: Could not retrieve detailed schema information.\n\n"
-        
-        # Add knowledge graph structure explanation
-        schema += """
-## Knowledge Graph Structure Explanation
-This knowledge graph contains historical events from World War I, particularly focused on events in April 1915.
+            self.move_to_end(key)
+        except KeyError:
+            return default
+        return self[key]
+    
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.cap:
+            self.popitem(last=False)
+
+# Rows and characters per value of the query results passed to the response LLM
+MAX_RESULT_ROWS = 50
+MAX_VALUE_LENGTH = 500
 
-1. Main Entity Types:
-   - LOCATION: Places (cities, countries, regions)
-   - PERSON: Individuals or groups (troops, soldiers)
-   - EVENT: Historical events (battles, capitulations, bombings)
-   - ORGANIZATION: Organizations (governments, military administrations)
-   - TIME: Temporal information (specific dates)
-   - SENTIMENT: Emotions or reactions (shock, anxiety)
-   - CONCEPT: Concepts or abstract ideas
+LIMIT_PATTERN = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+RETURN_PATTERN = re.compile(r"\bRETURN\b", re.IGNORECASE)
 
-2. Assertion Nodes:
-   - Intermediate nodes representing relationships between entities
-   - Have 'predicate' property describing the relationship type (captured, caused, occupied)
-   - Include confidence and source information
+def with_result_limit(query: str) -> str:
+    """Append LIMIT MAX_RESULT_ROWS to a generated query that returns rows without any LIMIT"""
+    if LIMIT_PATTERN.search(query) or not RETURN_PATTERN.search(query):
+        return query
+    return f"{query.rstrip().rstrip(';')}\nLIMIT {MAX_RESULT_ROWS}"
 
-3. Key Relationships:
-   - SUBJECT_OF: Connects subject entity to an Assertion
-   - OBJECT_IS: Connects Assertion to object entity
-   - HAS_TEMPORAL_CONTEXT: Connects Assertion to time context (when it occurred)
-   - HAS_SPATIAL_CONTEXT: Connects Assertion to location context (where it occurred)
+# Questions naming only years outside World War I are answered without querying the LLM or the graph
+# A number counts as a year only in a date context ("in 1870", "April 1915", "the 1870s"), not in "2000 prisoners"
+_YEAR = r"(1[89][0-9]{2}|20[0-9]{2})"
+_MONTH = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|Sept?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+YEAR_PATTERN = re.compile(
+    rf"\b(?:in|during|since|before|after|until|year)\s+(?:the\s+)?{_YEAR}\b"
+    rf"|\b{_MONTH}\.?\s+(?:[0-9]{{1,2}}(?:st|nd|rd|th)?,?\s+)?{_YEAR}\b"
+    rf"|\b{_YEAR}s\b",
+    re.IGNORECASE
+)
+OUT_OF_SCOPE_RESPONSE = ("<p>This knowledge graph covers <strong>World War I</strong> events, primarily from "
+                         "<strong>April 1915</strong>, so it has no information about the period you asked about.</p>")
 
-Sample Data:
-- Main actors: French troops, German troops
-- Key locations: Vienna, Somme, Drie-Grachten
-- Key events: capitulation of Przemysl, bombing raids
-- Temporal information: April 4, 1915, April 5, 1915
+def in_scope(question: str) -> bool:
+    """False if the question mentions years or decades and none of them overlaps 1914-1918"""
+    # findall returns one group per date context; only the matching one is non-empty
+    periods = []
+    for year, month_year, decade in YEAR_PATTERN.findall(question):
+        start = int(year or month_year or decade)
+        # "the 1910s" covers 1910-1919
+        periods.append((start, start + 9 if decade else start))
+    return not periods or any(start <= 1918 and end >= 1914 for start, end in periods)
 
-Query Examples:
-1. Find events that occurred on a specific date:
-   ```
-   MATCH (subject)-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
+# Cypher examples for the query prompt: (description, keywords, query)
+# Only the examples sharing the most keywords with the question are sent with it
+QUERY_EXAMPLES = [
+    ("Find events that occurred on a specific date",
+     {"when", "date", "dates", "day", "days", "time", "month", "year", "april", "march", "may",
+      "1914", "1915", "1916", "1917", "1918"},
+     """   MATCH (subject)-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
    MATCH (assertion)-[:HAS_TEMPORAL_CONTEXT]->(time:Entity:TIME)
    WHERE time.start_date = date("1915-04-04")
-   RETURN subject.text, assertion.predicate, object.text, time.text
-   ```
-
-2. Find events that occurred at a specific location:
-   ```
-   MATCH (subject)-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
+   RETURN subject.text, assertion.predicate, object.text, time.text"""),
+    ("Find events that occurred at a specific location",
+     {"where", "location", "locations", "place", "places", "city", "cities", "country", "countries",
+      "region", "front", "near", "happened"},
+     """   MATCH (subject)-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
    MATCH (assertion)-[:HAS_SPATIAL_CONTEXT]->(location:Entity:LOCATION {text: "Vienna"})
-   RETURN subject.text, assertion.predicate, object.text, location.text
-   ```
+   RETURN subject.text, assertion.predicate, object.text, location.text"""),
+    ("Find actions taken by a specific subject",
+     {"who", "did", "do", "does", "troops", "army", "armies", "soldiers", "people", "government",
+      "action", "actions", "attack", "attacked"},
+     """   MATCH (subject:Entity:PERSON {text: "French troops"})-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
+   RETURN subject.text, assertion.predicate, object.text"""),
+]
 
-3. Find actions taken by a specific subject:
-   ```
-   MATCH (subject:Entity:PERSON {text: "French troops"})-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object)
-   RETURN subject.text, assertion.predicate, object.text
-   ```
-"""
-        
-        return schema
+def select_query_examples(question: str, k: int = 2) -> str:
+    """Format the `k` query examples whose keywords overlap most with the question"""
+    words = set(re.findall(r"[a-z0-9]+", question.lower()))
+    # sorted() is stable, so ties keep the order of QUERY_EXAMPLES
+    ranked = sorted(QUERY_EXAMPLES, key=lambda example: len(words & example[1]), reverse=True)
     
-    def setup_query_chain(self):
-        """Set up the chain for converting natural language questions to Cypher queries"""
-        # Pydantic model for Cypher query generation
-        class CypherQueryOutput(BaseModel):
-            query: str = Field(description="Cypher query to execute in Neo4j")
-            explanation: str = Field(description="Explanation of how this query answers the natural language question")
-        
-        # Query generation prompt template
-        query_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert system that answers natural language questions using a Neo4j knowledge graph about historical events from World War I.
+    examples = ["Query Examples:\n"]
+    for i, (description, _, query) in enumerate(ranked[:k], 1):
+        examples.append(f"{i}. {description}:\n   ```\n{query}\n   ```\n")
+    return "".join(examples)
+
+# Node properties, relationship properties and entity counts in one round-trip
+SCHEMA_QUERY = """
+CALL {
+    CALL apoc.meta.nodeTypeProperties()
+    YIELD nodeType, propertyName, propertyTypes
+    WITH nodeType, collect({property: propertyName, types: propertyTypes}) AS properties
+    RETURN collect({nodeType: nodeType, properties: properties}) AS node_properties
+}
+CALL {
+    CALL apoc.meta.relTypeProperties()
+    YIELD relType, propertyName, propertyTypes
+    WITH relType, collect({property: propertyName, types: propertyTypes}) AS properties
+    RETURN collect({relType: relType, properties: properties}) AS rel_properties
+}
+CALL {
+    MATCH (e:Entity)
+    WITH e.type AS entityType, count(*) AS count
+    ORDER BY count DESC
+    RETURN collect({entityType: entityType, count: count}) AS entity_stats
+}
+RETURN node_properties, rel_properties, entity_stats
+"""
+
+def _property_pairs(properties: List[Dict[str, Any]]) -> List[str]:
+    """Format apoc.meta property entries as 'name: Type' pairs (types without properties report a null name)"""
+    formatted = []
+    for prop in properties:
+        if prop['property'] is None:
+            continue
+        # Handle the 'types' field safely
+        if isinstance(prop['types'], list):
+            types_str = '/'.join(prop['types'])
+        elif isinstance(prop['types'], str):
+            types_str = prop['types']
+        else:
+            types_str = str(prop['types'])
+        formatted.append(f"{prop['property']}: {types_str}")
+    return formatted
+
+# Pydantic model for Cypher query generation
+class CypherQueryOutput(BaseModel):
+    query: str = Field(description="Cypher query to execute in Neo4j")
+    explanation: str = Field(description="Explanation of how this query answers the natural language question")
+
+# Query generation prompt template
+QUERY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert system that answers natural language questions using a Neo4j knowledge graph about historical events from World War I.
 You need to understand the graph schema provided below and convert natural language questions into effective Cypher queries.
 
 {schema}
-
+{examples}
 Follow these rules:
 1. Generate a single, accurate Cypher query.
 2. The query results should directly answer the natural language question.
@@ -194,21 +173,12 @@ Follow these rules:
 10. Use LIMIT to restrict the number of results (e.g., LIMIT 10).
 
 Now generate the optimal Cypher query for the natural language question and explain it."""),
-            ("human", "Question: {question}")
-        ])
-        
-        # Use the with_structured_output method
-        structured_llm = self.llm.with_structured_output(CypherQueryOutput)
-        
-        # Create a simple chain that combines the prompt with the structured output model
-        self.query_chain = RunnablePassthrough.assign(
-            query_output=lambda x: structured_llm.invoke(query_prompt.format(schema=x["schema"], question=x["question"]))
-        )
-    
-    def setup_response_chain(self):
-        """Set up the chain for generating the final response using query results"""
-        response_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a knowledge graph-based question answering system for World War I history.
+    ("human", "Question: {question}")
+])
+
+# Answer generation prompt template
+RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a knowledge graph-based question answering system for World War I history.
 You need to answer natural language questions based on the provided query results.
 
 Follow these rules when crafting your response:
@@ -228,7 +198,7 @@ ALWAYS FORMAT YOUR RESPONSE USING HTML TAGS:
 - Ensure proper spacing and organization of content
 
 Analyze the structure and content of the query results thoroughly, and provide a natural, expert-like response considering the context of the user's question."""),
-            ("human", """Question: {question}
+    ("human", """Question: {question}
 
 Below are the query and results from the knowledge graph:
 
@@ -242,56 +212,245 @@ Results:
 {results}
 
 Please provide an answer to the question based on this information.""")
-        ])
+])
+
+class HistoricalKnowledgeGraphQA:
+    def __init__(self):
+        """Initialize the knowledge graph QA system using Neo4j and OpenAI"""
+        # Load settings
+        settings = Settings()
+        
+        # Create async Neo4j driver (connections are opened on first use and pooled across requests)
+        self.driver = AsyncGraphDatabase.driver(
+            settings.neo4j_uri,
+            auth=(settings.neo4j_username, settings.neo4j_password),
+            max_connection_pool_size=settings.neo4j_max_connection_pool_size,
+            connection_acquisition_timeout=settings.neo4j_connection_acquisition_timeout,
+            keep_alive=True
+        )
+        
+        # Graph schema information is loaded in initialize()
+        self.graph_schema = ""
+        
+        # Generated Cypher query and explanation by normalized question text
+        self._cypher_cache = _LRU(settings.query_cache_size)
+        
+        # (fetch time, records) by Cypher query text; the app never writes to the graph
+        self._result_cache = _LRU(settings.query_cache_size)
+        self._result_ttl = settings.query_result_ttl
         
+        # Initialize LLMs: a short structured output for the Cypher query, a longer answer for the response
+        # (the OpenAI client retries 408/409/429/5xx and connection errors with exponential
+        # backoff, waiting for the Retry-After header when the API sends one)
+        self.cypher_llm = ChatOpenAI(
+            model=settings.openai_model,
+            temperature=0,
+            api_key=settings.openai_api_key,
+            max_retries=settings.openai_max_retries,
+            max_tokens=settings.cypher_max_tokens
+        )
+        self.response_llm = ChatOpenAI(
+            model=settings.openai_model,
+            temperature=0,
+            api_key=settings.openai_api_key,
+            max_retries=settings.openai_max_retries,
+            max_tokens=settings.response_max_tokens
+        )
+        
+        # Initialize response generation chain (the query chain needs the schema, see initialize())
+        self.setup_response_chain()
+    
+    async def initialize(self):
+        """Verify the Neo4j connection, load the graph schema and warm up OpenAI (call once at app startup)"""
+        await self.driver.verify_connectivity()
+        
+        # Open the OpenAI connections while the schema queries run
+        self.graph_schema, _ = await asyncio.gather(self.get_graph_schema(), self.warm_up_llms())
+        
+        # Initialize query transformation chain with the schema bound into its prompt
+        self.setup_query_chain()
+    
+    async def warm_up_llms(self):
+        """Open the HTTPS connection of both LLM clients, so the first question skips the TLS handshake"""
+        try:
+            # Retrieving the model is authenticated but generates no tokens
+            await asyncio.gather(
+                self.cypher_llm.root_async_client.models.retrieve(self.cypher_llm.model_name),
+                self.response_llm.root_async_client.models.retrieve(self.response_llm.model_name)
+            )
+        except Exception as e:
+            print(f"Error warming up OpenAI connections: {e}")
+    
+    async def close(self):
+        """Close the Neo4j driver and its connection pool"""
+        await self.driver.close()
+    
+    async def query_graph(self, query: str) -> List[Dict[str, Any]]:
+        """Run a Cypher query and return the records as dictionaries"""
+        records, _, _ = await self.driver.execute_query(query)
+        return [record.data() for record in records]
+    
+    async def query_graph_cached(self, query: str) -> List[Dict[str, Any]]:
+        """Run a Cypher query, reusing the records of the same query fetched within the last `query_result_ttl` seconds"""
+        # Only surrounding whitespace is ignored; inner spacing may be part of a string literal
+        key = query.strip()
+        now = time.monotonic()
+        cached = self._result_cache.get(key)
+        if cached is not None and now - cached[0] < self._result_ttl:
+            return cached[1]
+        
+        results = await self.query_graph(query)
+        self._result_cache.put(key, (now, results))
+        return results
+    
+    async def get_graph_schema(self) -> str:
+        """Retrieve and format the schema information from the Neo4j graph"""
+        try:
+            schema_data = (await self.query_graph(SCHEMA_QUERY))[0]
+            node_properties = schema_data['node_properties']
+            rel_properties = schema_data['rel_properties']
+            entity_stats = schema_data['entity_stats']
+            
+            # Construct a compact schema card: one line per node/relationship type
+            schema_parts = ["# Knowledge Graph Schema\n\n"]
+            
+            schema_parts.append("Entity counts: ")
+            schema_parts.append(", ".join(f"{stat['entityType']} {stat['count']}" for stat in entity_stats))
+            schema_parts.append("\n\n")
+            
+            # Entity labels share the base properties; list those once and only the extras per label
+            node_pairs = {node['nodeType'].replace('`', ''): _property_pairs(node['properties']) for node in node_properties}
+            entity_labels = [label for label in node_pairs if label.startswith(':Entity:')]
+            shared = [pair for pair in node_pairs[entity_labels[0]]
+                      if all(pair in node_pairs[label] for label in entity_labels)] if entity_labels else []
+            
+            schema_parts.append("Node labels and properties:\n")
+            if shared:
+                schema_parts.append(f"- :Entity (every entity type): {', '.join(shared)}\n")
+            for label, pairs in node_pairs.items():
+                extra = [pair for pair in pairs if pair not in shared] if label in entity_labels else pairs
+                if extra:
+                    schema_parts.append(f"- {label}: {', '.join(extra)}\n")
+            schema_parts.append("\n")
+            
+            schema_parts.append("Relationship types and properties:\n")
+            for rel in rel_properties:
+                pairs = _property_pairs(rel['properties'])
+                schema_parts.append(f"- {rel['relType'].replace('`', '')}")
+                schema_parts.append(f": {', '.join(pairs)}\n" if pairs else "\n")
+            
+        except Exception as e:
+            print(f"Error generating schema: {e}")
+            # Return a simplified schema if we can't get the full details
+            schema_parts = ["# Knowledge Graph Schema\n\n", "Note: Could not retrieve detailed schema information.\n"]
+        
+        # Add knowledge graph structure explanation (query examples are added per question)
+        schema_parts.append("""
+## Structure
+World War I events, primarily from April 1915.
+- Entity types (extra label on every Entity node): LOCATION (cities, countries, regions), PERSON (individuals or groups such as troops), EVENT (battles, capitulations, bombings), ORGANIZATION (governments, military administrations), TIME (specific dates), SENTIMENT (emotions or reactions), CONCEPT (abstract ideas)
+- (subject:Entity)-[:SUBJECT_OF]->(assertion:Assertion)-[:OBJECT_IS]->(object:Entity); assertion.predicate describes the relationship (captured, caused, occupied)
+- (assertion)-[:HAS_TEMPORAL_CONTEXT]->(:Entity:TIME) is when it occurred; (assertion)-[:HAS_SPATIAL_CONTEXT]->(:Entity:LOCATION) is where
+- Sample data: French troops, German troops; Vienna, Somme, Drie-Grachten; capitulation of Przemysl, bombing raids; April 4, 1915, April 5, 1915
+""")
+        
+        return "".join(schema_parts)
+    
+    def setup_query_chain(self):
+        """Set up the chain for converting natural language questions to Cypher queries"""
+        # Use the with_structured_output method
+        structured_llm = self.cypher_llm.with_structured_output(CypherQueryOutput)
+        
+        # The schema never changes after startup, so bind it once; only examples and question vary per call
+        self.query_chain = QUERY_PROMPT.partial(schema=self.graph_schema) | structured_llm
+    
+    def setup_response_chain(self):
+        """Set up the chain for generating the final response using query results"""
         # Set up response generation chain
-        self.response_chain = response_prompt | self.llm | StrOutputParser()
+        self.response_chain = RESPONSE_PROMPT | self.response_llm | StrOutputParser()
     
     def format_results(self, results: List[Dict[str, Any]]) -> str:
         """Format query results into a readable format"""
         if not results:
             return "No results found."
         
-        formatted = ""
-        for i, result in enumerate(results, 1):
-            formatted += f"Result {i}:\n"
+        # Collect the pieces and join once; the LLM gets at most MAX_RESULT_ROWS rows of bounded values
+        formatted = []
+        for i, result in enumerate(results[:MAX_RESULT_ROWS], 1):
+            formatted.append(f"Result {i}:\n")
             for key, value in result.items():
                 if isinstance(value, (dict, list)):
-                    formatted += f"  {key}: {str(value)}\n"
+                    # orjson is much faster than str() on nested values; str() covers Neo4j date/time types
+                    value = orjson.dumps(value, default=str).decode()
                 else:
-                    formatted += f"  {key}: {value}\n"
-            formatted += "\n"
+                    value = str(value)
+                formatted.append(f"  {key}: {value[:MAX_VALUE_LENGTH]}\n")
+            formatted.append("\n")
         
-        return formatted
+        if len(results) > MAX_RESULT_ROWS:
+            formatted.append(f"... {len(results) - MAX_RESULT_ROWS} more results truncated\n")
+        
+        return "".join(formatted)
     
-    def process_query(self, question: str) -> str:
-        """Process a natural language question and generate a response"""
-        try:
+    async def _prepare_response_inputs(self, question: str) -> Dict[str, str]:
+        """Generate and run the Cypher query for a question, returning the response chain inputs"""
+        # Repeated questions (ignoring case and spacing) reuse the query generated before
+        cache_key = " ".join(question.lower().split())
+        query_output = self._cypher_cache.get(cache_key)
+        
+        if query_output is None:
             # 1. Convert natural language question to Cypher query
-            query_result = self.query_chain.invoke({
-                "schema": self.graph_schema,
+            query_output = await self.query_chain.ainvoke({
+                "examples": select_query_examples(question),
                 "question": question
             })
-            
-            # Access structured output
-            query_output = query_result["query_output"]
-            cypher_query = query_output.query
-            query_explanation = query_output.explanation
-            
-            # 2. Execute Cypher query
-            results = self.graph.query(cypher_query)
-            formatted_results = self.format_results(results)
+        
+        cypher_query = with_result_limit(query_output.query)
+        query_explanation = query_output.explanation
+        
+        # 2. Execute Cypher query
+        results = await self.query_graph_cached(cypher_query)
+        formatted_results = self.format_results(results)
+        
+        # Only cache queries that Neo4j accepted
+        self._cypher_cache.put(cache_key, query_output)
+        
+        return {
+            "question": question,
+            "query": cypher_query,
+            "explanation": query_explanation,
+            "results": formatted_results
+        }
+    
+    async def process_query(self, question: str) -> str:
+        """Process a natural language question and generate a response"""
+        if not in_scope(question):
+            return OUT_OF_SCOPE_RESPONSE
+        
+        try:
+            response_inputs = await self._prepare_response_inputs(question)
             
             # 3. Generate final response based on results
-            final_response = self.response_chain.invoke({
-                "question": question,
-                "query": cypher_query,
-                "explanation": query_explanation,
-                "results": formatted_results
-            })
+            final_response = await self.response_chain.ainvoke(response_inputs)
             
             # No text processing needed as LLM will return HTML directly
             return final_response
             
         except Exception as e:
-            return f"An error occurred while processing your question: {str(e)}"
\ No newline at end of file
+            return f"An error occurred while processing your question: {str(e)}"
+    
+    async def process_query_stream(self, question: str) -> AsyncIterator[str]:
+        """Process a natural language question, yielding the response in chunks as the LLM generates it"""
+        if not in_scope(question):
+            yield OUT_OF_SCOPE_RESPONSE
+            return
+        
+        try:
+            response_inputs = await self._prepare_response_inputs(question)
+            
+            # 3. Stream final response based on results
+            async for chunk in self.response_chain.astream(response_inputs):
+                yield chunk
+            
+        except Exception as e:
+            yield f"An error occurred while processing your question: {str(e)}"
\ No newline at end of file
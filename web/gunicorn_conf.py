@@ -0,0 +1,17 @@
+# Gunicorn settings for production (run from the web directory):
+#   gunicorn app.main:app -c gunicorn_conf.py
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Several worker processes, each with its own event loop, Neo4j pool and OpenAI clients
+# (os.cpu_count() returns None when the core count cannot be determined)
+concurrency = os.getenv("WEB_CONCURRENCY")
+workers = int(concurrency) if concurrency else (2 * (os.cpu_count() or 1)) + 1
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Keep idle client connections open between requests
+keepalive = 30
+
+# Startup loads the graph schema and warms up OpenAI, and answers can take a while
+timeout = 120
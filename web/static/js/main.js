@@ -115,32 +115,54 @@ document.addEventListener('DOMContentLoaded', function() {
                 `;
             }
             
-            // API call
-            fetch('/api/query', {
+            // API call (the answer is streamed as server-sent events and shown as it arrives)
+            fetch('/api/query_stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({ question: question }),
             })
-            .then(response => response.json())
-            .then(data => {
-                // Display response
+            .then(async response => {
                 const cardBody = responseCard.querySelector('.card-body');
-                if (data.detail) {
+                if (!response.ok) {
                     // Display error message
+                    const data = await response.json();
                     cardBody.innerHTML = `
                         <div class="alert alert-danger">
                             ${data.detail}
                         </div>
                     `;
-                } else {
-                    // Display successful response
-                    cardBody.innerHTML = `
-                        <div id="answer-text">
-                            ${data.answer}
-                        </div>
-                    `;
+                    return;
+                }
+                
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                let answer = '';
+                let answerText = null;
+                
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    
+                    // Events end with a blank line; keep an incomplete event in the buffer
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    for (const event of events) {
+                        // Strip the "data: " prefix from each line of the event
+                        answer += event.split('\n').map(line => line.slice(6)).join('\n');
+                    }
+                    
+                    // Replace the spinner with the answer once the first chunk arrives
+                    if (!answerText) {
+                        cardBody.innerHTML = '<div id="answer-text"></div>';
+                        answerText = cardBody.querySelector('#answer-text');
+                    }
+                    answerText.innerHTML = answer;
                 }
             })
             .catch(error => {